@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 from decouple import config, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -134,9 +135,99 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 ASGI_APPLICATION = "backend.routing.application"
 
+# Caching, a bounded local-memory LRU cache unless a redis cache is configured
+CACHE_REDIS_URL = config("CACHE_REDIS_URL", default="")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": config("CACHE_MAX_ENTRIES", default=10000, cast=int)},
+    }
+}
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+
+# Profile cache, see main.profile_cache
+PROFILE_CACHE_TTL = config("PROFILE_CACHE_TTL", default=300, cast=int)
+PROFILE_CACHE_VERSION = 1
+
+# Authenticated token cache, see main.auth. Only used with a cache shared by all the
+# processes, e.g. redis, the deletion of a token can't reach the local-memory caches
+# of the other processes, unless the deployment runs a single process
+AUTH_TOKEN_CACHE_TTL = config("AUTH_TOKEN_CACHE_TTL", default=60, cast=int)
+AUTH_TOKEN_CACHE_VERSION = 1
+AUTH_TOKEN_CACHE_SINGLE_PROCESS = config(
+    "AUTH_TOKEN_CACHE_SINGLE_PROCESS", default=False, cast=bool
+)
+
+# Keyset pagination, see main.pagination
+DEFAULT_PAGE_SIZE = config("DEFAULT_PAGE_SIZE", default=20, cast=int)
+FEED_PAGE_SIZE = config("FEED_PAGE_SIZE", default=20, cast=int)
+MESSAGES_PAGE_SIZE = config("MESSAGES_PAGE_SIZE", default=50, cast=int)
+MAX_PAGE_SIZE = config("MAX_PAGE_SIZE", default=100, cast=int)
+
+# Feed timelines, see main.timelines
+FEED_TIMELINE_BACKEND = config("FEED_TIMELINE_BACKEND", default="db")  # "db" or "redis"
+FEED_TIMELINE_REDIS_URL = config(
+    "FEED_TIMELINE_REDIS_URL", default="redis://127.0.0.1:6379/1"
+)
+FEED_TIMELINE_LENGTH = config("FEED_TIMELINE_LENGTH", default=800, cast=int)
+FEED_TIMELINE_BACKFILL = config("FEED_TIMELINE_BACKFILL", default=100, cast=int)
+FEED_FANOUT_MAX_DEGREE = config("FEED_FANOUT_MAX_DEGREE", default=1000, cast=int)
+
+# Local worker pool, see main.workers
+WORKER_POOL_SIZE = config("WORKER_POOL_SIZE", default=4, cast=int)
+
+# Post notifications are inserted in batches, and for more receivers than the threshold
+# they are inserted off the request path, in one transaction per batch (0 disables it)
+NOTIFICATION_FANOUT_BATCH_SIZE = config(
+    "NOTIFICATION_FANOUT_BATCH_SIZE", default=1000, cast=int
+)
+NOTIFICATION_FANOUT_DEFER_THRESHOLD = config(
+    "NOTIFICATION_FANOUT_DEFER_THRESHOLD", default=200, cast=int
+)
+# Number of receivers a notification is pushed to concurrently, see main.realtime
+NOTIFICATION_PUBLISH_CONCURRENCY = config(
+    "NOTIFICATION_PUBLISH_CONCURRENCY", default=100, cast=int
+)
+
+# Chat messages are saved in batches of up to CHAT_MESSAGE_BUFFER_SIZE, at most
+# CHAT_MESSAGE_FLUSH_INTERVAL seconds after they are received (1 saves every message right away)
+CHAT_MESSAGE_BUFFER_SIZE = config("CHAT_MESSAGE_BUFFER_SIZE", default=1, cast=int)
+CHAT_MESSAGE_FLUSH_INTERVAL = config(
+    "CHAT_MESSAGE_FLUSH_INTERVAL", default=0.5, cast=float
+)
+
+# Image renditions of the uploaded media, name -> largest side in pixels, see main.media
+MEDIA_RENDITIONS = {"thumbnail": 150, "feed": 1080}
+MEDIA_RENDITION_FORMAT = config("MEDIA_RENDITION_FORMAT", default="WEBP")
+MEDIA_RENDITION_QUALITY = config("MEDIA_RENDITION_QUALITY", default=80, cast=int)
+# generated on the worker pool, or within the request when off
+MEDIA_RENDITIONS_ASYNC = config("MEDIA_RENDITIONS_ASYNC", default=True, cast=bool)
+
+# Per endpoint request metrics, see main.metrics
+METRICS_ENABLED = config("METRICS_ENABLED", default=False, cast=bool)
+METRICS_DIR = config(
+    "METRICS_DIR", default=os.path.join(tempfile.gettempdir(), "backend-metrics")
+)
+METRICS_FLUSH_INTERVAL = config("METRICS_FLUSH_INTERVAL", default=10, cast=float)
+# requests running the same statement this many times are logged as likely N+1 queries
+METRICS_DUPLICATE_QUERY_THRESHOLD = config(
+    "METRICS_DUPLICATE_QUERY_THRESHOLD", default=10, cast=int
+)
+
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, "main.middleware.MetricsMiddleware")
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "knox.auth.TokenAuthentication",
+        "main.auth.CachedTokenAuthentication",
     ]
 }
 
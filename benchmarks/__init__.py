@@ -0,0 +1,20 @@
+"""
+Reproducible load benchmarks for the REST API and the chat websockets.
+
+A synthetic social graph is seeded into a fresh SQLite database by main.seeding, then
+concurrent clients drive the hot endpoints and the ConversationConsumer over the
+in-memory channel layer:
+
+    python -m benchmarks.run --users 500 --degree 20 --output before.json
+    python -m benchmarks.run --users 500 --degree 20 --output after.json
+    python -m benchmarks.compare before.json after.json
+
+The same arguments and --seed give the same dataset and the same request sequence,
+so the reports of two runs can be compared. SQLite allows a single writer at a time,
+so requests that write (e.g. marking messages as read) may fail under concurrency,
+they are reported as errors of their scenario.
+
+The number of queries of every list endpoint is checked against a fixed budget with:
+
+    python -m benchmarks.query_budget
+"""
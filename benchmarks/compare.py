@@ -0,0 +1,78 @@
+"""
+Compares two benchmark reports, exiting with status 1 when the second one regressed.
+
+    python -m benchmarks.compare before.json after.json [--tolerance 0.2]
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as report_file:
+        return json.load(report_file)
+
+
+def change(before, after):
+    if not before:
+        return 0.0 if not after else float("inf")
+    return (after - before) / before
+
+
+def compare(before, after, tolerance):
+    """
+    Yields (scenario, metric, before, after, regressed) for every scenario in both reports.
+    Latencies and throughput regress past the relative tolerance, since they are noisy.
+    Queries per request regress when the mean grows by more than half a query, an extra
+    query per request or per item shows up as at least one.
+    """
+    for scenario in sorted(set(before["scenarios"]) & set(after["scenarios"])):
+        old, new = before["scenarios"][scenario], after["scenarios"][scenario]
+
+        for stat in ("p50", "p99"):
+            a, b = old["latency_ms"][stat], new["latency_ms"][stat]
+            yield scenario, f"latency {stat} ms", a, b, change(a, b) > tolerance
+
+        a, b = old["throughput_rps"], new["throughput_rps"]
+        yield scenario, "throughput rps", a, b, change(a, b) < -tolerance
+
+        a, b = old["queries_per_request"]["mean"], new["queries_per_request"]["mean"]
+        yield scenario, "queries/request", a, b, b - a > 0.5
+
+        a, b = old["errors"], new["errors"]
+        yield scenario, "errors", a, b, b > a
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Relative change of the latencies and throughput still accepted.",
+    )
+    args = parser.parse_args(argv)
+
+    before, after = load(args.before), load(args.after)
+    dataset_and_load = [
+        {key: value for key, value in report["meta"]["arguments"].items() if key != "scenarios"}
+        for report in (before, after)
+    ]
+    if dataset_and_load[0] != dataset_and_load[1]:
+        print("Warning: the reports were run with different arguments.", file=sys.stderr)
+
+    regressions = 0
+    for scenario, metric, a, b, regressed in compare(before, after, args.tolerance):
+        regressions += regressed
+        print(
+            f"{'REGRESSED' if regressed else 'ok':<10}{scenario:<14}{metric:<18}"
+            f"{a:>12} -> {b:<12} ({change(a, b):+.1%})"
+        )
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Checks that every list endpoint runs at most a fixed number of queries, whatever the number of rows it lists.
+
+    python -m benchmarks.query_budget [--users 100]
+
+A dataset is seeded as for benchmarks.run, then every endpoint is requested on behalf of
+the users with the fewest and the most rows to list. Each request is made twice and the
+queries of the second one are counted, so that the token and profile caches are warm.
+Exits with status 1 when any request runs more queries than the budget of its endpoint.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks.run import setup
+
+
+# endpoint -> most queries per request
+BUDGETS = {
+    "feed": 5,
+    "posts": 2,
+    "connected_posts": 4,
+    "notifications": 2,
+    "connection_requests": 2,
+    "connections": 2,
+    "conversations": 2,
+    "messages": 7,
+}
+
+# rows added for the best connected user, as the seeded posts, messages and pending
+# requests are the same for every user
+EXTRA_ROWS = 50
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--degree", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--db", help="SQLite file to seed, a temporary one by default. Overwritten."
+    )
+    return parser.parse_args(argv)
+
+
+def extremes(counts):
+    """
+    The (key, count) pairs with the fewest and the most rows, out of a dict of key -> count.
+    """
+    ordered = sorted(counts.items(), key=lambda item: (item[1], item[0]))
+    return [ordered[0], ordered[-1]] if ordered else []
+
+
+def cases():
+    """
+    Yields (endpoint, useraccount id, path, rows) for the users with the fewest and the most rows.
+    """
+    from django.db.models import Count
+
+    from chat.models import Conversation, Message
+    from main.models import (
+        Connection,
+        ConnectionEdge,
+        Notification,
+        Post,
+        TimelineEntry,
+        UserAccount,
+    )
+
+    useraccounts = UserAccount.objects.select_related("user").in_bulk()
+    user_ids = list(useraccounts)
+
+    def per_user(queryset, field):
+        counts = dict.fromkeys(user_ids, 0)
+        counts.update(
+            queryset.order_by().values_list(field).annotate(count=Count("pk"))
+        )
+        return counts
+
+    for user_id, rows in extremes(per_user(TimelineEntry.objects, "owner")):
+        yield "feed", user_id, "/api/content/feed/", rows
+
+    for user_id, rows in extremes(per_user(Post.objects, "user")):
+        yield "posts", user_id, "/api/content/post/", rows
+
+    posts = per_user(Post.objects, "user")
+    edges = ConnectionEdge.objects.filter(state="accepted").values_list("user_id", "peer_id")
+    for (user_id, peer_id), rows in extremes(
+        {(user_id, peer_id): posts[peer_id] for user_id, peer_id in edges}
+    ):
+        username = useraccounts[peer_id].user.username
+        yield "connected_posts", user_id, f"/api/content/post/{username}", rows
+
+    for user_id, rows in extremes(per_user(Notification.sent_to.through.objects, "useraccount")):
+        yield "notifications", user_id, "/api/content/notification/", rows
+
+    pending = per_user(
+        Connection.users.through.objects.filter(connection__accepted=False), "useraccount"
+    )
+    for user_id, rows in extremes(pending):
+        yield "connection_requests", user_id, "/api/connections/connectionrequest/", rows
+
+    for user_id, rows in extremes(per_user(ConnectionEdge.objects.filter(state="accepted"), "user")):
+        yield "connections", user_id, "/api/connections/connections/", rows
+
+    for user_id, rows in extremes(per_user(Conversation.users.through.objects, "useraccount")):
+        yield "conversations", user_id, "/conversation/api/conversations", rows
+
+    messages = dict(
+        Message.objects.order_by()
+        .values_list("conversation")
+        .annotate(count=Count("pk"))
+    )
+    participants = Conversation.users.through.objects.values_list(
+        "conversation_id", "useraccount_id"
+    )
+    conversations = {}
+    for conversation_id, user_id in participants:
+        conversations.setdefault(conversation_id, []).append(user_id)
+    for (user_id, peer_id), rows in extremes(
+        {
+            tuple(users): messages.get(conversation_id, 0)
+            for conversation_id, users in conversations.items()
+            if len(users) == 2
+        }
+    ):
+        username = useraccounts[peer_id].user.username
+        yield "messages", user_id, f"/conversation/api/message/{username}/", rows
+
+
+def add_extra_rows():
+    """
+    Gives the best connected user EXTRA_ROWS more posts, messages in one of their conversations,
+    and pending connection requests from users they aren't connected to.
+    """
+    from chat.models import Conversation, Message
+    from main.models import Connection, Post, UserAccount
+
+    user = UserAccount.objects.order_by("-connections_count", "id").first()
+
+    Post.objects.bulk_create(
+        [Post(user=user, text=f"Extra post {index}") for index in range(EXTRA_ROWS)]
+    )
+
+    conversation = Conversation.objects.filter(users=user).first()
+    if conversation is not None:
+        Message.objects.bulk_create(
+            [
+                Message(conversation=conversation, sender=user, text=f"Extra message {index}")
+                for index in range(EXTRA_ROWS)
+            ]
+        )
+
+    connected = set(Connection.objects.connected_user_ids(user)) | {user.id}
+    for sender in UserAccount.objects.exclude(id__in=connected).order_by("id")[:EXTRA_ROWS]:
+        Connection.objects.create_connection_request(sender, user)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    db = args.db or os.path.join(tempfile.gettempdir(), "query_budget.sqlite3")
+    setup(db)
+
+    from knox.models import AuthToken
+    from rest_framework.test import APIClient
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from main.models import UserAccount
+    from main.seeding import Seeder
+
+    Seeder(
+        users=args.users,
+        degree=args.degree,
+        interactions_per_user=5,
+        conversations_per_user=2,
+        messages_per_conversation=10,
+        seed=args.seed,
+        prefix="budget",
+    ).run()
+    add_extra_rows()
+
+    users = UserAccount.objects.select_related("user").in_bulk()
+    tokens = {}
+    client = APIClient()
+
+    failed = False
+    for endpoint, user_id, path, rows in cases():
+        if user_id not in tokens:
+            tokens[user_id] = AuthToken.objects.create(users[user_id].user)[1]
+        client.credentials(HTTP_AUTHORIZATION=f"Token {tokens[user_id]}")
+
+        client.get(path)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path)
+
+        over = len(queries) > BUDGETS[endpoint]
+        failed = failed or over or response.status_code >= 500
+        print(
+            f"{'OVER' if over else 'ok':4}  {endpoint:20} {rows:5} rows  "
+            f"{len(queries):3} / {BUDGETS[endpoint]} queries  {response.status_code}  {path}"
+        )
+        if over:
+            for query in queries.captured_queries:
+                print(f"        {query['sql']}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
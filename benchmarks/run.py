@@ -0,0 +1,368 @@
+"""
+Seeds a fresh database and drives the hot endpoints with concurrent clients,
+printing a JSON report of the throughput, latencies and queries per request of every scenario.
+
+    python -m benchmarks.run --help
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+HTTP_SCENARIOS = ("feed", "notifications", "connections", "messages")
+SCENARIOS = HTTP_SCENARIOS + ("conversation",)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    graph = parser.add_argument_group("dataset")
+    graph.add_argument("--users", type=int, default=200)
+    graph.add_argument("--degree", type=int, default=10, help="Mean connections per user.")
+    graph.add_argument(
+        "--graph", choices=("uniform", "power-law", "clustered"), default="power-law"
+    )
+    graph.add_argument("--posts-per-user", type=int, default=5)
+    graph.add_argument(
+        "--interactions-per-user",
+        type=int,
+        default=10,
+        help="Likes and reports of posts of connections, each notified.",
+    )
+    graph.add_argument("--conversations-per-user", type=int, default=2)
+    graph.add_argument("--messages-per-conversation", type=int, default=50)
+    graph.add_argument("--seed", type=int, default=0)
+
+    load = parser.add_argument_group("load")
+    load.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help=f"Comma separated, out of {', '.join(SCENARIOS)}.",
+    )
+    load.add_argument("--clients", type=int, default=4, help="Concurrent clients.")
+    load.add_argument(
+        "--requests", type=int, default=50, help="Requests (or messages) per client."
+    )
+    load.add_argument(
+        "--warmup", type=int, default=10, help="Requests run first, not measured."
+    )
+
+    parser.add_argument(
+        "--db", help="SQLite file to seed, a temporary one by default. Overwritten."
+    )
+    parser.add_argument("--output", help="Write the report here instead of stdout.")
+    return parser.parse_args(argv)
+
+
+def setup(db):
+    os.environ["DJANGO_SETTINGS_MODULE"] = "benchmarks.settings"
+    os.environ["BENCHMARK_DB"] = db
+    if os.path.exists(db):
+        os.remove(db)
+
+    import django
+
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    call_command("migrate", verbosity=0)
+    # readers don't block the writer, persisted in the database file
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+
+class Graph(object):
+    def __init__(self):
+        # (UserAccount id, username) of every user
+        self.users = []
+        # (UserAccount id, peer UserAccount id) of every conversation
+        self.conversations = []
+
+
+class QueryCounter(object):
+    """
+    Counts the queries of every database connection, in total and per thread.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.local.count = getattr(self.local, "count", 0) + 1
+        with self.lock:
+            self.total += 1
+        return execute(sql, params, many, context)
+
+    def thread_count(self):
+        return getattr(self.local, "count", 0)
+
+    def install(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        def wrap(sender, connection, **kwargs):
+            if self not in connection.execute_wrappers:
+                connection.execute_wrappers.append(self)
+
+        connection_created.connect(wrap, weak=False)
+        for connection in connections.all():
+            wrap(None, connection)
+
+
+def percentile(values, fraction):
+    # nearest rank
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, round(fraction * len(values)) - 1))]
+
+
+def summarize(latencies, queries, errors, wall_time):
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall_time, 2) if wall_time else 0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0,
+            "p50": round(percentile(latencies, 0.5) * 1000, 3),
+            "p90": round(percentile(latencies, 0.9) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(max(latencies, default=0) * 1000, 3),
+        },
+        "queries_per_request": {
+            "mean": round(sum(queries) / len(queries), 2) if queries else 0,
+            "max": max(queries, default=0),
+        },
+    }
+
+
+def http_paths(scenario, graph, rng, count, tokens):
+    """
+    Returns count (token, path) requests of the scenario, from random users of the graph.
+    """
+    usernames = dict(graph.users)
+    requests = []
+    for _ in range(count):
+        if scenario == "messages":
+            user, peer = rng.choice(graph.conversations)
+            path = f"/conversation/api/message/{usernames[peer]}/"
+        else:
+            user, _ = rng.choice(graph.users)
+            path = {
+                "feed": "/api/content/feed/",
+                "notifications": "/api/content/notification/",
+                "connections": "/api/connections/connections/",
+            }[scenario]
+        requests.append((tokens[user], path))
+    return requests
+
+
+def run_http(requests, clients, counter, warmup=()):
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    def run(batch, measure=True):
+        # failed requests are counted as errors instead of stopping the run
+        client = APIClient(raise_request_exception=False)
+        results = []
+        try:
+            for token, path in batch:
+                queries = counter.thread_count()
+                started = time.perf_counter()
+                response = client.get(path, HTTP_AUTHORIZATION=f"Token {token}")
+                latency = time.perf_counter() - started
+                results.append(
+                    (latency, counter.thread_count() - queries, response.status_code >= 400)
+                )
+        finally:
+            connection.close()
+        return results if measure else []
+
+    run(warmup, measure=False)
+
+    batches = [requests[index::clients] for index in range(clients)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = [result for batch in executor.map(run, batches) for result in batch]
+    wall_time = time.perf_counter() - started
+
+    return summarize(
+        [latency for latency, _, _ in results],
+        [queries for _, queries, _ in results],
+        sum(error for _, _, error in results),
+        wall_time,
+    )
+
+
+def run_conversation(graph, rng, tokens, clients, messages, counter):
+    """
+    Every client connects to its own conversation and sends messages one after the other,
+    timing each until it comes back from the conversation group.
+    """
+    from channels.testing import WebsocketCommunicator
+
+    from backend.routing import application
+
+    usernames = dict(graph.users)
+    conversations = rng.sample(graph.conversations, min(clients, len(graph.conversations)))
+
+    async def client(user, peer):
+        communicator = WebsocketCommunicator(
+            application, f"/conversation/{usernames[peer]}/?token={tokens[user]}"
+        )
+        connected, _ = await communicator.connect(timeout=10)
+        if not connected:
+            return [], messages
+
+        await communicator.receive_json_from(timeout=10)  # connection confirmation
+        latencies, errors = [], 0
+        for index in range(messages):
+            started = time.perf_counter()
+            await communicator.send_json_to(
+                {"text": f"Benchmark {index}", "media": None, "sender": usernames[user]}
+            )
+            try:
+                while "text" not in await communicator.receive_json_from(timeout=10):
+                    pass
+                latencies.append(time.perf_counter() - started)
+            except asyncio.TimeoutError:
+                errors += 1
+        await communicator.disconnect()
+        return latencies, errors
+
+    async def main():
+        return await asyncio.gather(*[client(user, peer) for user, peer in conversations])
+
+    queries = counter.total
+    started = time.perf_counter()
+    results = asyncio.run(main())
+    wall_time = time.perf_counter() - started
+    queries = counter.total - queries
+
+    latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+    summary = summarize(latencies, [], sum(errors for _, errors in results), wall_time)
+    # the consumers share the database threads, so only the mean per message is known
+    summary["queries_per_request"] = {
+        "mean": round(queries / len(latencies), 2) if latencies else 0,
+        "max": None,
+    }
+    return summary
+
+
+def git_revision():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [scenario for scenario in args.scenarios.split(",") if scenario]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    db = args.db or os.path.join(tempfile.gettempdir(), "benchmark.sqlite3")
+    setup(db)
+
+    import django
+    from knox.models import AuthToken
+
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+
+    from chat.models import Conversation
+
+    from main.seeding import Seeder
+
+    started = time.perf_counter()
+    Seeder(
+        users=args.users,
+        degree=args.degree,
+        graph=args.graph,
+        posts_per_user=args.posts_per_user,
+        interactions_per_user=args.interactions_per_user,
+        conversations_per_user=args.conversations_per_user,
+        messages_per_conversation=args.messages_per_conversation,
+        seed=args.seed,
+        prefix="bench",
+    ).run()
+    seed_time = time.perf_counter() - started
+
+    graph = Graph()
+    tokens = {}
+    for user in User.objects.select_related("useraccount").order_by("id"):
+        graph.users.append((user.useraccount.id, user.username))
+        tokens[user.useraccount.id] = AuthToken.objects.create(user)[1]
+
+    participants = defaultdict(list)
+    for conversation_id, useraccount_id in Conversation.users.through.objects.order_by(
+        "conversation_id", "useraccount_id"
+    ).values_list("conversation_id", "useraccount_id"):
+        participants[conversation_id].append(useraccount_id)
+    graph.conversations = [tuple(pair) for pair in participants.values()]
+
+    counter = QueryCounter()
+    counter.install()
+
+    report = {
+        "meta": {
+            "arguments": {
+                key: value for key, value in vars(args).items() if key not in ("db", "output")
+            },
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "seed_seconds": round(seed_time, 2),
+        },
+        "scenarios": {},
+    }
+
+    for scenario in scenarios:
+        # a generator per scenario and cold caches, so that each one runs the same
+        # whatever else runs before it
+        rng = random.Random(f"{args.seed}:{scenario}")
+        cache.clear()
+        if scenario == "conversation":
+            result = run_conversation(
+                graph, rng, tokens, args.clients, args.requests, counter
+            )
+        else:
+            requests = http_paths(
+                scenario, graph, rng, args.warmup + args.clients * args.requests, tokens
+            )
+            result = run_http(
+                requests[args.warmup :], args.clients, counter, requests[: args.warmup]
+            )
+        report["scenarios"][scenario] = result
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Settings of the benchmark runs: the project settings on a SQLite file database,
+the in-memory channel layer and the local-memory cache, so nothing else has to run.
+"""
+import os
+
+# the project settings require these, any value does for a local run
+for name, value in {
+    "SECRET_KEY": "benchmarks",
+    "DEBUG": "False",
+    "ALLOWED_HOSTS": "*",
+    "CORS_ORIGIN_WHITELIST": "http://localhost",
+    "DB_NAME": "",
+    "DB_USER": "",
+    "DB_PASSWORD": "",
+    "DB_HOST": "",
+    "DB_PORT": "",
+}.items():
+    os.environ.setdefault(name, value)
+
+from backend.settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get("BENCHMARK_DB", "benchmark.sqlite3"),
+        # concurrent clients wait on the write lock instead of failing right away
+        "OPTIONS": {"timeout": 30},
+    }
+}
+
+CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+# the clients are threads of a single process
+AUTH_TOKEN_CACHE_SINGLE_PROCESS = True
+
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
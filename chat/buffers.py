@@ -0,0 +1,65 @@
+"""
+Write-behind buffering of the messages received by a ConversationConsumer.
+"""
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from django.db.transaction import atomic
+
+from .models import Conversation, Message
+
+
+logger = logging.getLogger(__name__)
+
+
+class MessageBuffer(object):
+    """
+    Collects the messages of a conversation and saves them with a single bulk_create,
+    once max_size messages are pending or at most flush_interval seconds after the first one.
+    The updated_at of the conversation is bumped once per flush instead of once per message.
+    flush() must also be awaited when the consumer disconnects.
+    """
+
+    def __init__(self, conversation, max_size, flush_interval):
+        self.conversation = conversation
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.flush_task = None
+        self.lock = asyncio.Lock()
+
+    async def add(self, message):
+        self.pending.append(message)
+
+        if len(self.pending) >= self.max_size:
+            await self.flush()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self.flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception(
+                "Failed to save the messages of conversation %s.", self.conversation.pk
+            )
+
+    async def flush(self):
+        if self.flush_task is not None and self.flush_task is not asyncio.current_task():
+            self.flush_task.cancel()
+            self.flush_task = None
+
+        async with self.lock:
+            messages, self.pending = self.pending, []
+            if messages:
+                await database_sync_to_async(self.save)(messages)
+
+    def save(self, messages):
+        with atomic():
+            Message.objects.bulk_create(messages)
+            Conversation.objects.filter(pk=self.conversation.pk).update(
+                updated_at=messages[-1].created_at
+            )
@@ -1,6 +1,9 @@
+from django.conf import settings
 from main.models import UserAccount
+from main.realtime import connection_group_name, notification_group_name
 from asgiref.sync import sync_to_async
-from .models import Conversation, Message
+from .buffers import MessageBuffer
+from .models import Conversation, ConversationReadState, Message
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
@@ -11,6 +14,10 @@ from django.contrib.auth.models import AnonymousUser
 import json
 
 
+# message ids are AutoField ids, signed 32 bit integers
+MAX_MESSAGE_ID = 2 ** 31 - 1
+
+
 class ConversationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         if isinstance(self.scope["user"], AnonymousUser):
@@ -34,11 +41,31 @@ class ConversationConsumer(AsyncWebsocketConsumer):
             Conversation.objects.get_or_create_conversation
         )(connecting_user, other_user)
 
-        self.conversation_name = self.conversation.name
+        self.conversation_name = self.conversation.group_name
+
+        # resolved once for the lifetime of the socket, and dropped by connection_removed
+        self.sender = connecting_user
+        self.participant_ids = await sync_to_async(
+            lambda: frozenset(self.conversation.users.values_list("id", flat=True))
+        )()
+        self.connection_group_name = connection_group_name(
+            connecting_user.id, other_user.id
+        )
+
+        self.message_buffer = None
+        if settings.CHAT_MESSAGE_BUFFER_SIZE > 1:
+            self.message_buffer = MessageBuffer(
+                self.conversation,
+                settings.CHAT_MESSAGE_BUFFER_SIZE,
+                settings.CHAT_MESSAGE_FLUSH_INTERVAL,
+            )
 
         await self.accept()
 
         await self.channel_layer.group_add(self.conversation_name, self.channel_name)
+        await self.channel_layer.group_add(
+            self.connection_group_name, self.channel_name
+        )
 
         await self.channel_layer.group_send(
             self.conversation_name,
@@ -60,17 +87,48 @@ class ConversationConsumer(AsyncWebsocketConsumer):
         )
 
     async def disconnect(self, close_code):
+        if self.message_buffer is not None:
+            await self.message_buffer.flush()
+
         await self.channel_layer.group_discard(
             self.conversation_name, self.channel_name
         )
+        await self.channel_layer.group_discard(
+            self.connection_group_name, self.channel_name
+        )
+
+    async def connection_removed(self, event):
+        # the users aren't connected anymore, so nothing cached for the socket is valid
+        if self.message_buffer is not None:
+            await self.message_buffer.flush()
+
+        self.sender = None
+        self.participant_ids = frozenset()
+
+        await self.close()
 
     async def receive(self, text_data):
+        if self.sender is None:
+            return
+
         text_data_json = json.loads(text_data)
+
+        if text_data_json.get("type") == "read":
+            try:
+                message_id = int(text_data_json["message_id"])
+            except (KeyError, TypeError, ValueError):
+                # a malformed read frame is dropped, rather than closing the socket
+                return
+            if not 0 < message_id <= MAX_MESSAGE_ID:
+                return
+            await self.mark_read(message_id)
+            return
+
         text = text_data_json["text"]
         media = text_data_json["media"]
         sendername = text_data_json["sender"]
 
-        sender = await sync_to_async(UserAccount.objects.get)(user=self.scope["user"])
+        sender = self.sender
 
         await self.save_message(sender, text, media)
 
@@ -99,8 +157,73 @@ class ConversationConsumer(AsyncWebsocketConsumer):
             )
         )
 
+    async def mark_read(self, message_id):
+        moved = await database_sync_to_async(ConversationReadState.objects.mark_read)(
+            self.conversation, self.sender, message_id
+        )
+        if not moved:
+            return
+
+        await self.channel_layer.group_send(
+            self.conversation_name,
+            {
+                "type": "read_receipt",
+                "reader": self.scope["user"].username,
+                "message_id": message_id,
+            },
+        )
+
+    async def read_receipt(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "reader": event["reader"],
+                    "read": event["message_id"],
+                }
+            )
+        )
+
+    async def save_message(self, sender, text, media):
+        if self.message_buffer is None:
+            await self.write_message(sender, text, media)
+        else:
+            message = Message.objects.build_message(
+                self.conversation, sender, text, media, self.participant_ids
+            )
+            await self.message_buffer.add(message)
+
     @database_sync_to_async
-    def save_message(self, sender, text, media):
-        message = Message.objects.save_message(self.conversation, sender, text, media)
-        self.conversation.updated_at = message.updated_at
-        self.conversation.save()
+    def write_message(self, sender, text, media):
+        message = Message.objects.save_message(
+            self.conversation, sender, text, media, self.participant_ids
+        )
+        Conversation.objects.filter(pk=self.conversation.pk).update(
+            updated_at=message.updated_at
+        )
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes the notifications of the logged in user as they are created,
+    see main.realtime.publish_notification.
+    """
+
+    async def connect(self):
+        if isinstance(self.scope["user"], AnonymousUser):
+            raise ValidationError("Anonymous User not allowed.")
+
+        connecting_user = await sync_to_async(UserAccount.objects.get)(
+            user=self.scope["user"]
+        )
+
+        self.group_name = notification_group_name(connecting_user.id)
+
+        await self.accept()
+
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def send_notification(self, event):
+        await self.send(text_data=json.dumps(event["notification"]))
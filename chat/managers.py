@@ -1,60 +1,193 @@
 from django.db import models
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 
 from main.models import Connection
 
 
+def get_pair_key(user1, user2):
+    """
+    Canonical key of a pair of users, the same whichever way round they are given.
+    """
+    return "{}-{}".format(*sorted([user1.id, user2.id]))
+
+
 class ConversationManager(models.Manager):
     def get_or_create_conversation(self, user1, user2):
-        connection = (
-            Connection.objects.filter(users=user1)
-            .filter(users=user2)
-            .filter(accepted=True)
-            .distinct()
-        )
-
-        if not connection.exists():
+        if not Connection.objects.are_connected(user1, user2):
             raise ObjectDoesNotExist("No connection exists between the users.")
 
-        conversations = (
-            self.get_queryset().filter(users=user1).filter(users=user2).distinct()
-        )
-
-        if not conversations.exists():
-            conversation = self.create(name=f"{user1.first_name}-{user2.first_name}")
-            conversation.users.add(user1)
-            conversation.users.add(user2)
-            return conversation
+        pair_key = get_pair_key(user1, user2)
+        conversation = self.get_queryset().filter(pair_key=pair_key).first()
 
-        return conversations.first()
+        if conversation is None:
+            # the primary key is the pair key, so every row is inserted or ignored at once,
+            # conversations created concurrently for the same pair end up the same one
+            through = self.model.users.through
+            read_state_model = self.model.read_states.rel.related_model
+            self.bulk_create(
+                [self.model(name=pair_key, pair_key=pair_key)], ignore_conflicts=True
+            )
+            through.objects.bulk_create(
+                [
+                    through(conversation_id=pair_key, useraccount_id=user1.id),
+                    through(conversation_id=pair_key, useraccount_id=user2.id),
+                ],
+                ignore_conflicts=True,
+            )
+            read_state_model.objects.bulk_create(
+                [
+                    read_state_model(conversation_id=pair_key, user=user1),
+                    read_state_model(conversation_id=pair_key, user=user2),
+                ],
+                ignore_conflicts=True,
+            )
+            conversation = self.get_queryset().get(pair_key=pair_key)
 
-    def by_user(self, user):
-        conversations = self.get_queryset().filter(users__in=[user])
+        return conversation
 
-        if not conversations.exists():
-            return None
+    def unread_count(self, user, conversation="pk"):
+        """
+        Expression counting the messages of a conversation received by the user after their read watermark,
+        to annotate with. conversation names the field of the annotated rows holding the conversation.
+        Only the messages past the watermark are visited.
+        """
+        last_read_message_id = (
+            self.model.read_states.rel.related_model.objects.filter(
+                conversation=OuterRef(OuterRef(conversation)), user=user
+            ).values("last_read_message_id")[:1]
+        )
+        unread_messages = (
+            self.model.messages.rel.related_model.objects.filter(
+                conversation=OuterRef(conversation),
+                id__gt=Coalesce(Subquery(last_read_message_id), 0),
+            )
+            .exclude(sender=user)
+            .order_by()
+            .values("conversation")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return Coalesce(
+            Subquery(unread_messages, output_field=models.IntegerField()), 0
+        )
 
-        connected_users = []
+    def summaries(self, user):
+        """
+        One row per conversation of the user, most recently active first, with the profile
+        of the other user, the last message and the unread count, all in a single query.
+        """
+        through = self.model.users.through
+        last_message = self.model.messages.rel.related_model.objects.filter(
+            conversation=OuterRef("conversation_id")
+        ).order_by("-id")
 
-        for conversation in conversations:
-            users = conversation.users.all()
-            connected_user = (
-                ((users[0] != user) and users[0]) or (users[1] != user) and users[1]
+        return (
+            through.objects.filter(conversation__users=user)
+            .exclude(useraccount=user)
+            .annotate(
+                last_message_text=Subquery(last_message.values("text")[:1]),
+                last_message_sender_id=Subquery(last_message.values("sender_id")[:1]),
+                last_message_at=Subquery(last_message.values("created_at")[:1]),
+                last_activity=Coalesce("last_message_at", "conversation__updated_at"),
+                unread=self.unread_count(user, conversation="conversation_id"),
             )
-            connected_users.append(connected_user)
-
-        return conversations, connected_users
+            .order_by("-last_activity", "conversation_id")
+            .values(
+                "conversation_id",
+                "last_activity",
+                "useraccount_id",
+                "useraccount__first_name",
+                "useraccount__last_name",
+                "useraccount__display_picture",
+                "useraccount__user__username",
+                "last_message_text",
+                "last_message_sender_id",
+                "last_message_at",
+                "unread",
+            )
+        )
 
 
 class MessageManager(models.Manager):
-    def save_message(self, conversation, sender, text=None, media=None):
+    def in_conversation(self, conversation):
+        """
+        Messages of the conversation, for MessagesAPI. Meant to be listed as
+        .values_list(*MESSAGE_LOOKUPS) rows, which join the sender by themselves,
+        see chat.representations.
+        """
+        return self.get_queryset().filter(conversation=conversation)
+
+    def build_message(
+        self, conversation, sender, text=None, media=None, participant_ids=None
+    ):
+        """
+        Validates and returns a new, unsaved message, e.g. to be saved in bulk later.
+        participant_ids, the UserAccount ids of the conversation, saves the query
+        checking the sender is part of it when they are already known.
+        """
         if not text and not media:
             raise ValidationError("Can't send message without tet and media.")
-        if sender not in conversation.users.all():
+        if participant_ids is None:
+            participant_ids = conversation.users.values_list("id", flat=True)
+        if sender.id not in participant_ids:
             raise ValidationError(
                 "Can't send message to a conversation if the sender is not part of it."
             )
 
-        return self.create(
+        return self.model(
             conversation=conversation, sender=sender, text=text, media=media
         )
+
+    def save_message(
+        self, conversation, sender, text=None, media=None, participant_ids=None
+    ):
+        message = self.build_message(
+            conversation, sender, text, media, participant_ids
+        )
+        message.save(force_insert=True)
+        return message
+
+
+class ReadStateManager(models.Manager):
+    def mark_read(self, conversation, user, message_id):
+        """
+        Moves the read watermark of the user in the conversation up to message_id,
+        a single row UPDATE. The watermark never moves back, nor to an id that isn't a
+        message of the conversation. Returns whether the watermark moved.
+        """
+        message = conversation.messages.filter(id=message_id)
+        updated = (
+            self.get_queryset()
+            .filter(
+                Exists(message),
+                conversation=conversation,
+                user=user,
+                last_read_message_id__lt=message_id,
+            )
+            .update(last_read_message_id=message_id)
+        )
+        if updated:
+            return True
+
+        if not message.exists():
+            return False
+
+        # conversations created before the read states existed may have no row yet
+        _, created = self.get_or_create(
+            conversation=conversation,
+            user=user,
+            defaults={"last_read_message_id": message_id},
+        )
+        return created
+
+    def last_read_message_ids(self, conversation):
+        """
+        Maps the ids of the users of the conversation to their read watermark.
+        """
+        return dict(
+            self.get_queryset()
+            .filter(conversation=conversation)
+            .values_list("user_id", "last_read_message_id")
+        )
@@ -0,0 +1,61 @@
+# Generated by Django 3.1.5 on 2026-10-18 16:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Max
+
+
+def migrate_read_flags(apps, schema_editor):
+    # the watermark of a user is the most recent message they received that was flagged as read
+    Conversation = apps.get_model("chat", "Conversation")
+    Message = apps.get_model("chat", "Message")
+    ConversationReadState = apps.get_model("chat", "ConversationReadState")
+
+    read_states = []
+    for conversation in Conversation.objects.prefetch_related("users"):
+        for user in conversation.users.all():
+            last_read_message_id = (
+                Message.objects.filter(conversation=conversation, read=True)
+                .exclude(sender=user)
+                .aggregate(last_read_message_id=Max("id"))["last_read_message_id"]
+            )
+            read_states.append(
+                ConversationReadState(
+                    conversation=conversation,
+                    user=user,
+                    last_read_message_id=last_read_message_id or 0,
+                )
+            )
+
+    ConversationReadState.objects.bulk_create(read_states, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_notification_counters'),
+        ('chat', '0005_auto_20210125_2029'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationReadState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_read_message_id', models.PositiveIntegerField(default=0)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='chat.conversation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.useraccount')),
+            ],
+            options={
+                'verbose_name': 'Conversation Read State',
+                'unique_together': {('conversation', 'user')},
+            },
+        ),
+        migrations.RunPython(migrate_read_flags, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='read',
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.1.5 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+def populate_pair_keys(apps, schema_editor):
+    # duplicate conversations of the same pair are merged into the oldest one
+    Conversation = apps.get_model("chat", "Conversation")
+    Message = apps.get_model("chat", "Message")
+
+    seen = {}
+    for conversation in Conversation.objects.prefetch_related("users").order_by(
+        "created_at", "name"
+    ):
+        user_ids = sorted(user.id for user in conversation.users.all())
+        if len(user_ids) != 2:
+            # not a conversation between two users, keyed by its unique name instead
+            conversation.pair_key = conversation.name
+            conversation.save(update_fields=["pair_key"])
+            continue
+
+        pair_key = "{}-{}".format(*user_ids)
+        if pair_key in seen:
+            Message.objects.filter(conversation=conversation).update(
+                conversation=seen[pair_key]
+            )
+            conversation.delete()
+            continue
+
+        conversation.pair_key = pair_key
+        conversation.save(update_fields=["pair_key"])
+        seen[pair_key] = conversation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_conversationreadstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='pair_key',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.RunPython(populate_pair_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='conversation',
+            name='pair_key',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.template.defaultfilters import slugify
 
 from main.models import TrackingModel, UserAccount
-from .managers import ConversationManager, MessageManager
+from .managers import ConversationManager, MessageManager, ReadStateManager
 
 
 def get_media_path(instance, filename):
@@ -14,11 +14,19 @@ class Conversation(TrackingModel):
     name = models.CharField(max_length=50, primary_key=True)
     users = models.ManyToManyField(UserAccount, related_name="conversation_between")
 
+    # ordered UserAccount ids of the two users, see managers.get_pair_key
+    pair_key = models.CharField(max_length=50, unique=True)
+
     objects = ConversationManager()
 
     def __str__(self):
         return f"{self.users.first()} and {self.users.last()}"
 
+    @property
+    def group_name(self):
+        # channel layer group of the ConversationConsumers of this conversation
+        return f"conversation_{self.pair_key}"
+
 
 class Message(TrackingModel):
     conversation = models.ForeignKey(
@@ -31,9 +39,34 @@ class Message(TrackingModel):
 
     media = models.FileField(upload_to=get_media_path, blank=True, null=True)
 
-    read = models.BooleanField(default=False)
-
     objects = MessageManager()
 
     def __str__(self):
         return f"From <Thread - {self.conversation}>"
+
+
+class ConversationReadState(TrackingModel):
+    """
+    Read watermark of a user in a conversation, every message of the conversation
+    up to last_read_message_id, that wasn't sent by the user, is read by them.
+    """
+
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, related_name="read_states"
+    )
+
+    user = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="+")
+
+    last_read_message_id = models.PositiveIntegerField(default=0)
+
+    objects = ReadStateManager()
+
+    class Meta:
+        verbose_name = "Conversation Read State"
+        unique_together = (
+            "conversation",
+            "user",
+        )
+
+    def __str__(self):
+        return f"[{self.user_id}] read <Thread - {self.conversation_id}> up to {self.last_read_message_id}"
@@ -0,0 +1,41 @@
+"""
+Read-only representations of the chat models, see main.representations.
+"""
+from main.representations import Representation, datetime, file_url, nested
+
+from .models import Message
+
+
+# chat.serializers.SenderSerializer
+SENDER = Representation(
+    ("first_name", "first_name", None),
+    ("last_name", "last_name", None),
+)
+
+# chat.serializers.MessageSerializer, but for "read", see messages
+MESSAGE = Representation(
+    ("id", "id", None),
+    nested("sender", "sender", SENDER),
+    ("text", "text", None),
+    ("media", "media", file_url(Message, "media")),
+    ("created_at", "created_at", datetime),
+)
+
+MESSAGE_LOOKUPS = MESSAGE.lookups + ("sender_id",)
+
+
+def messages(rows, last_read_message_ids):
+    """
+    Representations of a list of .values_list(*MESSAGE_LOOKUPS) rows of messages, each read
+    once any other user of the conversation has read past it, as given by
+    ConversationReadState.objects.last_read_message_ids.
+    """
+    represented = MESSAGE.from_rows(rows)
+    for representation, row in zip(represented, rows):
+        sender_id = row[-1]
+        representation["read"] = any(
+            last_read_message_id >= representation["id"]
+            for user_id, last_read_message_id in last_read_message_ids.items()
+            if user_id != sender_id
+        )
+    return represented
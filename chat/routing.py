@@ -1,7 +1,8 @@
 from django.urls import path
 
-from .consumers import ConversationConsumer
+from .consumers import ConversationConsumer, NotificationConsumer
 
 websocket_urlpatterns = [
     path("conversation/<str:username>/", ConversationConsumer.as_asgi()),
+    path("notifications/", NotificationConsumer.as_asgi()),
 ]
@@ -1,16 +1,17 @@
 from rest_framework import serializers
 
 from .models import Message
+from main.metrics import SerializerTimingMixin
 from main.models import UserAccount
 
 
-class SenderSerializer(serializers.ModelSerializer):
+class SenderSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     class Meta:
         model = UserAccount
         fields = ("first_name", "last_name")
 
 
-class ConversationSerializer(serializers.Serializer):
+class ConversationSerializer(SerializerTimingMixin, serializers.Serializer):
     name = serializers.CharField(max_length=200)
     first_name = serializers.CharField(max_length=200)
     last_name = serializers.CharField(max_length=200)
@@ -19,9 +20,25 @@ class ConversationSerializer(serializers.Serializer):
     updated_at = serializers.DateTimeField()
 
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(SerializerTimingMixin, serializers.ModelSerializer):
+    """
+    Expects the read watermarks of the conversation, as given by
+    ConversationReadState.objects.last_read_message_ids, in the "last_read_message_ids" context.
+    """
+
     sender = SenderSerializer()
+    read = serializers.SerializerMethodField()
+
+    def get_read(self, message):
+        # read once any other user of the conversation has read past it
+        return any(
+            last_read_message_id >= message.id
+            for user_id, last_read_message_id in self.context[
+                "last_read_message_ids"
+            ].items()
+            if user_id != message.sender_id
+        )
 
     class Meta:
         model = Message
-        fields = ("sender", "text", "media", "created_at", "read")
+        fields = ("id", "sender", "text", "media", "created_at", "read")
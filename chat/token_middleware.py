@@ -3,19 +3,22 @@ from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 
 from urllib.parse import parse_qs
-from knox.auth import TokenAuthentication
+from main.auth import CachedTokenAuthentication
 from knox.models import AuthToken as Token
+from rest_framework.exceptions import AuthenticationFailed
 
 
 @database_sync_to_async
 def get_user(scope):
     try:
         token_key = parse_qs(scope["query_string"].decode("utf8"))["token"][0]
-        auther = TokenAuthentication()
+        auther = CachedTokenAuthentication()
         user, _ = auther.authenticate_credentials(token_key.encode())
         return user
     except Token.DoesNotExist:
         return AnonymousUser()
+    except AuthenticationFailed:
+        return AnonymousUser()
     except KeyError:
         return AnonymousUser()
 
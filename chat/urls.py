@@ -3,7 +3,13 @@ from django.urls import path
 from .views import ConversationAPI, MessagesAPI, ConversationListAPI
 
 urlpatterns = [
-    path("api/conversations", ConversationListAPI.as_view()),
-    path("api/conversation/<str:username>", ConversationAPI.as_view()),
-    path("api/message/<str:sent_to>/", MessagesAPI.as_view()),
+    path(
+        "api/conversations", ConversationListAPI.as_view(), name="conversation_list"
+    ),
+    path(
+        "api/conversation/<str:username>",
+        ConversationAPI.as_view(),
+        name="conversation",
+    ),
+    path("api/message/<str:sent_to>/", MessagesAPI.as_view(), name="messages"),
 ]
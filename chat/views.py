@@ -1,16 +1,21 @@
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.serializers import DateTimeField
 
-from knox.auth import TokenAuthentication
+from main.auth import CachedTokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
 
+from django.conf import settings
+from main.pagination import KeysetPagination
 from main.models import UserAccount
-from django.db.transaction import atomic
-from .models import Conversation, Message
+from main.realtime import publish_read_receipt
+from django.db.transaction import atomic, on_commit
+from .models import Conversation, ConversationReadState, Message
 from django.contrib.auth.models import User
-from .serializers import ConversationSerializer, MessageSerializer
+from .representations import MESSAGE_LOOKUPS, messages as represent_messages
+from .serializers import ConversationSerializer
 
 
 class ConversationListAPI(APIView):
@@ -19,36 +24,54 @@ class ConversationListAPI(APIView):
     Allowed Methods: GET
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        conversations, conversations_with = Conversation.objects.by_user(
-            request.user.useraccount
-        )
+        user = request.user.useraccount
+        conversations = Conversation.objects.summaries(user)
 
-        if not conversations_with or not conversations.exists():
-            return Response(status=status.HTTP_404_NOT_FOUND)
+        display_picture_storage = UserAccount._meta.get_field("display_picture").storage
+        datetime_field = DateTimeField()
 
         open_conversations_with = []
-        for conversation, useraccount in zip(conversations, conversations_with):
+        for conversation in conversations:
+            username = conversation["useraccount__user__username"]
+            display_picture = conversation["useraccount__display_picture"]
+
+            last_message = None
+            if conversation["last_message_sender_id"] is not None:
+                last_message = {
+                    "text": conversation["last_message_text"],
+                    "sender": request.user.username
+                    if conversation["last_message_sender_id"] == user.id
+                    else username,
+                    "created_at": datetime_field.to_representation(
+                        conversation["last_message_at"]
+                    ),
+                }
+
             open_conversations_with.append(
                 {
-                    "name": conversation.name,
-                    "first_name": useraccount.first_name,
-                    "last_name": useraccount.last_name,
-                    "display_picture": useraccount.display_picture,
-                    "username": useraccount.user.username,
-                    "updated_at": conversation.updated_at,
+                    "name": conversation["conversation_id"],
+                    "first_name": conversation["useraccount__first_name"],
+                    "last_name": conversation["useraccount__last_name"],
+                    "display_picture": display_picture_storage.url(display_picture)
+                    if display_picture
+                    else None,
+                    "username": username,
+                    "updated_at": datetime_field.to_representation(
+                        conversation["last_activity"]
+                    ),
+                    "last_message": last_message,
+                    "unread": conversation["unread"],
                 }
             )
 
-        conversations_serialized = ConversationSerializer(
-            data=open_conversations_with, many=True
-        )
-        conversations_serialized.is_valid(raise_exception=True)
+        if not open_conversations_with:
+            return Response(status=status.HTTP_404_NOT_FOUND)
 
-        return Response(conversations_serialized.data)
+        return Response(open_conversations_with)
 
 
 class ConversationAPI(APIView):
@@ -57,7 +80,7 @@ class ConversationAPI(APIView):
     Allowed Methods: POST, DELETE
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request, username):
@@ -92,22 +115,83 @@ class ConversationAPI(APIView):
 
 class MessagesAPI(APIView):
     """
-    API to retrieve all the messages belonging to a particular conversation.
+    API to retrieve the messages belonging to a particular conversation, a page at a time.
     Allowed Methods: GET
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     @atomic
     def get(self, request, sent_to):
+        """
+        Query Params:
+            before (optional): the messages preceding this message id, the latest ones by default
+            after (optional): the messages following this message id
+            page_size (optional)
+
+        The messages of a page are ordered oldest first. The response has the shape:
+            {
+                "before": <id to pass as before for the preceding page, null if there is none>,
+                "after": <id to pass as after for the following messages>,
+                "results": [...]
+            }
+        """
+        try:
+            before = request.query_params.get("before")
+            before = None if before is None else int(before)
+            after = request.query_params.get("after")
+            after = None if after is None else int(after)
+        except ValueError:
+            return Response(
+                {"detail": "before and after should be message ids."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        paginator = KeysetPagination(page_size=settings.MESSAGES_PAGE_SIZE)
+        page_size = paginator.get_page_size(request)
+
         sender = request.user.useraccount
-        receiver = UserAccount.objects.get(user=User.objects.get(username=sent_to))
+        receiver = UserAccount.objects.get(user__username=sent_to)
         conversation = Conversation.objects.get_or_create_conversation(sender, receiver)
-        messages = Message.objects.filter(conversation=conversation)
-        for message in messages:
-            if message.sender != sender:
-                message.read = True
-                message.save()
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data)
+
+        messages = Message.objects.in_conversation(conversation).values_list(
+            *MESSAGE_LOOKUPS
+        )
+
+        # the rows start with the message id
+        if after is not None:
+            page = list(messages.filter(id__gt=after).order_by("id")[:page_size])
+            cursors = {
+                "before": page[0][0] if page else None,
+                # polling with the same id is fine while nothing new arrived
+                "after": page[-1][0] if page else after,
+            }
+        else:
+            if before is not None:
+                messages = messages.filter(id__lt=before)
+            # fetching one extra message tells whether there are older ones
+            page = list(messages.order_by("-id")[: page_size + 1])
+            has_older = len(page) > page_size
+            page = page[:page_size][::-1]
+            cursors = {
+                "before": page[0][0] if page and has_older else None,
+                "after": page[-1][0] if page else None,
+            }
+
+        last_read_message_ids = ConversationReadState.objects.last_read_message_ids(
+            conversation
+        )
+        # the messages shown are read, up to the most recent one of the page,
+        # nothing is written when the watermark is past it already
+        if page and page[-1][0] > last_read_message_ids.get(sender.id, -1):
+            ConversationReadState.objects.mark_read(conversation, sender, page[-1][0])
+            last_read_message_ids[sender.id] = page[-1][0]
+            on_commit(
+                lambda: publish_read_receipt(
+                    conversation.group_name, request.user.username, page[-1][0]
+                )
+            )
+
+        results = represent_messages(page, last_read_message_ids)
+        return Response(dict(cursors, results=results))
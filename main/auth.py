@@ -0,0 +1,131 @@
+"""
+Knox token authentication with a short-lived cache of the authenticated principals.
+
+Knox looks a token up in the AuthToken table and hashes it on every request and
+every socket connect. Here, a successful authentication is cached under a hash of the
+token for AUTH_TOKEN_CACHE_TTL seconds, and never past the expiry of the token, so
+most authentications are a single cache hit. The entry holds the user, the digest and
+the expiry of the token, and is set again whenever knox writes a renewed expiry.
+Entries are invalidated when their token is deleted (logout, logoutall, or expiry
+cleanup by knox) and whenever their user is saved, e.g. renamed, deactivated or given
+a new password. The invalidation of a process-local cache doesn't reach the other
+processes, which would keep accepting a deleted token, so with the local-memory cache
+tokens are authenticated by knox alone, unless AUTH_TOKEN_CACHE_SINGLE_PROCESS is set.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+from knox.settings import knox_settings
+
+
+# backends whose entries other processes don't see
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def is_token_cache_enabled():
+    if settings.AUTH_TOKEN_CACHE_TTL <= 0:
+        return False
+
+    backend = settings.CACHES["default"]["BACKEND"]
+    return (
+        backend not in PROCESS_LOCAL_CACHE_BACKENDS
+        or settings.AUTH_TOKEN_CACHE_SINGLE_PROCESS
+    )
+
+
+def _token_key(token):
+    # the raw token is never used as a cache key
+    return "auth:token:{}".format(hashlib.sha256(token.encode()).hexdigest())
+
+
+def _digest_key(digest):
+    return f"auth:digest:{digest}"
+
+
+def invalidate_token(digest):
+    token_key = cache.get(_digest_key(digest), version=settings.AUTH_TOKEN_CACHE_VERSION)
+    keys = [_digest_key(digest)]
+    if token_key is not None:
+        keys.append(token_key)
+
+    cache.delete_many(keys, version=settings.AUTH_TOKEN_CACHE_VERSION)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement of knox's TokenAuthentication, for the REST views and the
+    websocket TokenAuthMiddleware alike.
+    """
+
+    def _cache(self, token_key, auth_token):
+        timeout = settings.AUTH_TOKEN_CACHE_TTL
+        if auth_token.expiry is not None:
+            timeout = min(timeout, (auth_token.expiry - timezone.now()).total_seconds())
+        if timeout > 0:
+            cache.set_many(
+                {
+                    token_key: (auth_token.user, auth_token.digest, auth_token.expiry),
+                    _digest_key(auth_token.digest): token_key,
+                },
+                timeout=timeout,
+                version=settings.AUTH_TOKEN_CACHE_VERSION,
+            )
+
+    def authenticate_credentials(self, token):
+        if not is_token_cache_enabled():
+            return super().authenticate_credentials(token)
+
+        token_key = _token_key(token.decode("utf-8"))
+        cached = cache.get(token_key, version=settings.AUTH_TOKEN_CACHE_VERSION)
+        if cached is not None:
+            user, digest, expiry = cached
+            if expiry is None or expiry > timezone.now():
+                # only what the views use of the token, e.g. its pk to delete it on logout
+                auth_token = AuthToken(digest=digest, user=user, expiry=expiry)
+                auth_token._state.adding = False
+
+                if knox_settings.AUTO_REFRESH and expiry:
+                    # throttled by knox, only writes every MIN_REFRESH_INTERVAL
+                    self.renew_token(auth_token)
+                    renewed = (auth_token.expiry - expiry).total_seconds()
+                    if renewed > knox_settings.MIN_REFRESH_INTERVAL:
+                        self._cache(token_key, auth_token)
+                    else:
+                        auth_token.expiry = expiry
+
+                return self.validate_user(auth_token)
+
+            # expired, knox deletes it below
+            cache.delete(token_key, version=settings.AUTH_TOKEN_CACHE_VERSION)
+
+        user, auth_token = super().authenticate_credentials(token)
+        self._cache(token_key, auth_token)
+
+        return user, auth_token
+
+
+@receiver(post_delete, sender=AuthToken)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.digest)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    # the cached entries hold the user as it was authenticated
+    if created:
+        return
+
+    for digest in AuthToken.objects.filter(user=instance).values_list(
+        "digest", flat=True
+    ):
+        invalidate_token(digest)
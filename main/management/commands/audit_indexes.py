@@ -0,0 +1,161 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import OuterRef
+
+from chat.models import Conversation, ConversationReadState, Message
+from main import representations
+from main.models import (
+    Connection,
+    ConnectionEdge,
+    Notification,
+    Post,
+    PostInteraction,
+    TimelineEntry,
+    UserAccount,
+)
+
+
+PAGE_SIZE = 20
+
+
+def hot_queries(user, peer, post, conversation):
+    """
+    The querysets of the hot manager queries, with sample arguments, by name.
+    """
+    return {
+        "PostManager.by_user": Post.objects.by_user(user).values_list(
+            *representations.POST.lookups
+        ),
+        "PostManager.feed_posts": Post.objects.feed_posts(
+            [post.id], Connection.objects.connected_user_ids(user)
+        ),
+        "ConnectionManager.are_connected": ConnectionEdge.objects.filter(
+            user=user, peer=peer, state="accepted"
+        )[:1],
+        "ConnectionManager.connected_user_ids": Connection.objects.connected_user_ids(
+            user
+        ),
+        "ConnectionManager.pending_requests": Connection.objects.pending_requests(
+            user
+        ).values_list(*representations.CONNECTION.lookups),
+        "NotificationManager.received_by": Notification.objects.received_by(
+            user
+        ).order_by("-notification_id")[:PAGE_SIZE],
+        "NotificationManager.create_like_notification": Notification.objects.filter(
+            notification_type="like", sent_by=user, post=post
+        ),
+        "PostInteraction of a user": PostInteraction.objects.filter(post=post, user=user),
+        "PostInteractionManager.toggle": Post.objects.annotate(
+            connected=Connection.objects.connected_expression(user, OuterRef("user"))
+        ).filter(id=post.id),
+        "Timeline page": TimelineEntry.objects.filter(owner=user)
+        .order_by("-created_at", "-post_id")
+        .values_list("created_at", "post_id")[:PAGE_SIZE],
+        "ConversationManager.get_or_create_conversation": Conversation.objects.filter(
+            pair_key=conversation.pair_key
+        ),
+        "ConversationManager.summaries": Conversation.objects.summaries(user),
+        "MessageManager.in_conversation": Message.objects.in_conversation(conversation)
+        .order_by("-id")
+        .values_list("id")[:PAGE_SIZE],
+        "ReadStateManager.last_read_message_ids": ConversationReadState.objects.filter(
+            conversation=conversation
+        ).values_list("user_id", "last_read_message_id"),
+    }
+
+
+def explain(queryset):
+    """
+    Returns the plan of the queryset as a list of (step, problem) pairs, problem being
+    None, "full scan", "full index scan" or "sort".
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+        columns = [column[0].lower() for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    plan = []
+    if connection.vendor == "sqlite":
+        # EXPLAIN QUERY PLAN, e.g. "SCAN TABLE main_post" or "SEARCH main_post USING INDEX ..."
+        for row in rows:
+            detail = row["detail"]
+            problem = None
+            if detail.startswith("SCAN"):
+                problem = "full index scan" if " USING " in detail else "full scan"
+            elif "TEMP B-TREE" in detail:
+                problem = "sort"
+            plan.append((detail, problem))
+
+    elif connection.vendor == "mysql":
+        # EXPLAIN, a row per table with its access type
+        for row in rows:
+            extra = row.get("extra") or ""
+            problem = {"ALL": "full scan", "index": "full index scan"}.get(row["type"])
+            if problem is None and "filesort" in extra:
+                problem = "sort"
+            plan.append(
+                (
+                    "{table}: type={type} key={key} rows={rows} {extra}".format(
+                        table=row["table"],
+                        type=row["type"],
+                        key=row["key"],
+                        rows=row["rows"],
+                        extra=extra,
+                    ).strip(),
+                    problem,
+                )
+            )
+
+    else:
+        raise CommandError(f"EXPLAIN isn't supported for the {connection.vendor} backend.")
+
+    return plan
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on the hot manager queries against the configured database and reports "
+        "the full scans. Plans depend on the data, run it against a representative database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Print the full plan of every query, not only of the flagged ones.",
+        )
+        parser.add_argument(
+            "--fail",
+            action="store_true",
+            help="Exit with an error when any query does a full scan.",
+        )
+
+    def handle(self, *args, **options):
+        # the best connected user and their data make the most representative sample,
+        # unsaved placeholders stand in for what doesn't exist
+        user = UserAccount.objects.order_by("-connections_count", "id").first()
+        if user is None:
+            raise CommandError("The database has no users, seed it first, e.g. with seed_data.")
+        peer = Connection.objects.get_connected_users(user).first() or UserAccount(id=0)
+        post = Post.objects.filter(user=peer).first() or Post(id=0)
+        conversation = Conversation.objects.filter(users=user).first() or Conversation(
+            name="0-0", pair_key="0-0"
+        )
+
+        full_scans = 0
+        for name, queryset in hot_queries(user, peer, post, conversation).items():
+            plan = explain(queryset)
+            problems = sorted({problem for _, problem in plan if problem})
+            full_scans += "full scan" in problems
+
+            if problems:
+                self.stdout.write(self.style.WARNING(f"{name}: {', '.join(problems)}"))
+            else:
+                self.stdout.write(f"{name}: ok")
+            if problems or options["verbose_plans"]:
+                for step, problem in plan:
+                    self.stdout.write(f"    {step}" + (f"  <- {problem}" if problem else ""))
+
+        if full_scans and options["fail"]:
+            raise CommandError(f"{full_scans} queries do a full scan.")
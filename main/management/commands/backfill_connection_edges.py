@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic
+
+from main.models import Connection, ConnectionEdge
+
+
+class Command(BaseCommand):
+    help = "Builds the ConnectionEdge adjacency rows for the already existing connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of connections processed per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        through = Connection.users.through
+
+        connections = Connection.objects.order_by("id").values_list(
+            "id", "sent_by_id", "accepted"
+        )
+
+        created = 0
+        last_id = 0
+        while True:
+            batch = list(connections.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            users = {}
+            for connection_id, useraccount_id in through.objects.filter(
+                connection_id__in=[connection_id for connection_id, _, _ in batch]
+            ).values_list("connection_id", "useraccount_id"):
+                users.setdefault(connection_id, []).append(useraccount_id)
+
+            edges = []
+            for connection_id, sent_by_id, accepted in batch:
+                pair = users.get(connection_id, [])
+                if len(pair) != 2 or sent_by_id not in pair:
+                    self.stderr.write(f"Skipping malformed connection {connection_id}.")
+                    continue
+
+                receiver_id = pair[0] if pair[1] == sent_by_id else pair[1]
+                edges.append(
+                    ConnectionEdge(
+                        connection_id=connection_id,
+                        user_id=sent_by_id,
+                        peer_id=receiver_id,
+                        state="accepted" if accepted else "sent",
+                    )
+                )
+                edges.append(
+                    ConnectionEdge(
+                        connection_id=connection_id,
+                        user_id=receiver_id,
+                        peer_id=sent_by_id,
+                        state="accepted" if accepted else "received",
+                    )
+                )
+
+            with atomic():
+                # rows already present for a pair are kept as they are
+                ConnectionEdge.objects.bulk_create(edges, ignore_conflicts=True)
+            created += len(edges)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {created} connection edges.")
+        )
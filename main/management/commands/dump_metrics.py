@@ -0,0 +1,72 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main import metrics
+
+
+COLUMNS = (
+    ("latency_ms", "p50"),
+    ("latency_ms", "p99"),
+    ("query_count", "p50"),
+    ("query_count", "max"),
+    ("query_ms", "p99"),
+    ("serializer_ms", "p99"),
+    ("response_bytes", "p99"),
+)
+
+
+class Command(BaseCommand):
+    help = "Prints the per endpoint request metrics collected by the running processes in METRICS_DIR."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--json", action="store_true", help="Print the full summaries as JSON."
+        )
+        parser.add_argument(
+            "--sort",
+            default="latency_ms",
+            choices=sorted(metrics.HISTOGRAMS),
+            help="Histogram to sort the endpoints by, on its p99, highest first.",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Remove the collected snapshots after printing them.",
+        )
+
+    def handle(self, *args, **options):
+        summaries = {
+            endpoint: endpoint_metrics.summary()
+            for endpoint, endpoint_metrics in metrics.load(settings.METRICS_DIR).items()
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(summaries, indent=2, sort_keys=True))
+        elif not summaries:
+            self.stdout.write(f"No metrics collected in {settings.METRICS_DIR}.")
+        else:
+            header = ["endpoint", "requests", "n+1"] + [
+                f"{name} {stat}" for name, stat in COLUMNS
+            ]
+            rows = [
+                [endpoint, summary["latency_ms"]["count"], summary["duplicate_query_requests"]]
+                + [round(summary[name][stat], 1) for name, stat in COLUMNS]
+                for endpoint, summary in sorted(
+                    summaries.items(),
+                    key=lambda item: item[1][options["sort"]]["p99"],
+                    reverse=True,
+                )
+            ]
+            widths = [
+                max(len(str(row[index])) for row in [header] + rows)
+                for index in range(len(header))
+            ]
+            for row in [header] + rows:
+                self.stdout.write(
+                    "  ".join(str(value).ljust(width) for value, width in zip(row, widths))
+                )
+
+        if options["reset"]:
+            metrics.clear(settings.METRICS_DIR)
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main import timelines
+from main.models import UserAccount
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the materialized feed timelines, e.g. for existing data or after switching FEED_TIMELINE_BACKEND."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=settings.FEED_TIMELINE_LENGTH,
+            help="Number of the most recent posts kept in every timeline.",
+        )
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="usernames",
+            help="Rebuild the timeline of this user only, can be repeated.",
+        )
+
+    def handle(self, *args, **options):
+        useraccounts = UserAccount.objects.order_by("id")
+        if options["usernames"]:
+            useraccounts = useraccounts.filter(user__username__in=options["usernames"])
+
+        rebuilt = 0
+        for useraccount in useraccounts.iterator():
+            timelines.rebuild(useraccount, options["limit"])
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timelines."))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Post
+
+
+def _count(**filters):
+    return Post.objects.interaction_count(**filters)
+
+
+class Command(BaseCommand):
+    help = "Recomputes the likes and reports counters of the posts from the PostInteractions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of posts checked per query.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the posts whose counters are off.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        posts = (
+            Post.objects.order_by("id")
+            .annotate(actual_likes=_count(like=True), actual_reports=_count(report=True))
+            .only("id", "likes", "reports")
+        )
+
+        fixed = 0
+        last_id = 0
+        while True:
+            batch = list(posts.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            mismatched = []
+            for post in batch:
+                if post.likes != post.actual_likes or post.reports != post.actual_reports:
+                    self.stdout.write(
+                        f"Post {post.id}: likes {post.likes} -> {post.actual_likes}, "
+                        f"reports {post.reports} -> {post.actual_reports}"
+                    )
+                    mismatched.append(post.id)
+
+            if mismatched and not options["dry_run"]:
+                # recounted within the UPDATE, so interactions since the check aren't lost
+                Post.objects.filter(id__in=mismatched).update(
+                    likes=_count(like=True), reports=_count(report=True)
+                )
+            fixed += len(mismatched)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{fixed} posts had their counters off"
+                + ("." if options["dry_run"] else ", fixed.")
+            )
+        )
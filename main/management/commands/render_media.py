@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from main import media
+from main.models import Post, UserAccount
+
+
+class Command(BaseCommand):
+    help = "Generates the missing renditions of the post media and display pictures, e.g. of uploads made before them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Regenerate the renditions already generated too, e.g. after changing MEDIA_RENDITIONS.",
+        )
+
+    def handle(self, *args, **options):
+        targets = (
+            (Post, "media", "media_renditions", media.process_post_media),
+            (
+                UserAccount,
+                "display_picture",
+                "display_picture_renditions",
+                media.process_display_picture,
+            ),
+        )
+
+        for model, field, renditions_field, process in targets:
+            rendered = 0
+            rows = (
+                model.objects.exclude(**{field: ""})
+                .order_by("id")
+                .values_list("id", field, renditions_field)
+            )
+            for pk, name, renditions in rows.iterator():
+                if options["all"] or renditions.get(media.ORIGINAL) != name:
+                    # run right away, one at a time, missing files and non images are skipped
+                    if process(pk):
+                        rendered += 1
+
+            self.stdout.write(
+                self.style.SUCCESS(f"Rendered the {field} of {rendered} {model.__name__}s.")
+            )
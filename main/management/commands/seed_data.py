@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.seeding import GRAPH_MODELS, Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates synthetic users, connections, posts, interactions, notifications, "
+        "conversations and messages through chunked bulk inserts, see main.seeding."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument(
+            "--degree", type=int, default=20, help="Mean number of connections per user."
+        )
+        parser.add_argument("--graph", choices=GRAPH_MODELS, default="power-law")
+        parser.add_argument(
+            "--cluster-size",
+            type=int,
+            default=50,
+            help="Users per community of the clustered graph.",
+        )
+        parser.add_argument(
+            "--cross-fraction",
+            type=float,
+            default=0.1,
+            help="Fraction of the connections leaving the community in the clustered graph.",
+        )
+        parser.add_argument("--posts-per-user", type=int, default=5)
+        parser.add_argument(
+            "--interactions-per-user",
+            type=int,
+            default=10,
+            help="Likes and reports by every user on posts of their connections, each notified.",
+        )
+        parser.add_argument("--conversations-per-user", type=int, default=2)
+        parser.add_argument("--messages-per-conversation", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--prefix",
+            default="seed",
+            help="Prefix of the generated usernames, has to differ to seed the same database again.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--skip-timelines",
+            action="store_true",
+            help="Don't rebuild the feed timelines of the generated users.",
+        )
+
+    def handle(self, *args, **options):
+        seeder = Seeder(
+            users=options["users"],
+            degree=options["degree"],
+            graph=options["graph"],
+            cluster_size=options["cluster_size"],
+            cross_fraction=options["cross_fraction"],
+            posts_per_user=options["posts_per_user"],
+            interactions_per_user=options["interactions_per_user"],
+            conversations_per_user=options["conversations_per_user"],
+            messages_per_conversation=options["messages_per_conversation"],
+            seed=options["seed"],
+            prefix=options["prefix"],
+            batch_size=options["batch_size"],
+            log=lambda message: self.stdout.write(f"{time.perf_counter() - started:.1f}s {message}"),
+        )
+
+        started = time.perf_counter()
+        try:
+            counts = seeder.run(rebuild_timelines=not options["skip_timelines"])
+        except ValueError as error:
+            raise CommandError(error)
+
+        for label, count in sorted(counts.items()):
+            self.stdout.write(f"{label}: {count}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Seeded in {time.perf_counter() - started:.1f}s.")
+        )
@@ -1,8 +1,131 @@
 import random
 
-from django.db import models
-from django.db.transaction import atomic
+from django.conf import settings
+from django.db import IntegrityError, models
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.transaction import atomic, on_commit
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.utils import timezone
+
+
+class PostManager(models.Manager):
+    """
+    The list builders return the posts with what their representation needs, ready to be
+    listed as instances or as .values_list() rows, see main.representations.
+    """
+
+    def by_user(self, user):
+        """
+        Posts of the user, for PostListAPI and ConnectedUserPostListAPI.
+        """
+        return self.get_queryset().filter(user=user)
+
+    def feed_posts(self, post_ids, connected_user_ids):
+        """
+        The given posts of a feed page, but for those by users who aren't connected anymore,
+        which the timelines may still briefly hold.
+        """
+        return self.get_queryset().filter(id__in=post_ids, user__in=connected_user_ids)
+
+    def add_to_counter(self, post_id, field, delta):
+        """
+        Changes the likes or reports counter of a post in a single UPDATE,
+        computed by the database so that concurrent updates don't overwrite each other.
+        Counters never go below zero.
+        """
+        posts = self.get_queryset().filter(id=post_id)
+        if delta < 0:
+            posts = posts.filter(**{f"{field}__gte": -delta})
+
+        return posts.update(**{field: F(field) + delta})
+
+    def interaction_count(self, **filters):
+        """
+        Expression counting the PostInteractions of every post that match filters, e.g. like=True,
+        to annotate the posts or update their counters with.
+        """
+        interactions = self.model.postinteraction_set.rel.related_model.objects
+        return Coalesce(
+            Subquery(
+                interactions.filter(post=OuterRef("pk"), **filters)
+                .order_by()
+                .values("post")
+                .annotate(count=Count("id"))
+                .values("count"),
+                output_field=models.IntegerField(),
+            ),
+            0,
+        )
+
+
+class PostInteractionManager(models.Manager):
+    # interaction -> the counter of the post it changes
+    COUNTERS = {"like": "likes", "report": "reports"}
+
+    def _flip(self, user, post, interaction, value):
+        # conditional, so that concurrent toggles of the same interaction flip it once each
+        return (
+            self.get_queryset()
+            .filter(user=user, post=post, **{interaction: not value})
+            .update(**{interaction: value, "updated_at": timezone.now()})
+        )
+
+    def _toggle_row(self, user, post, interaction, create=True):
+        # returns the new value of the interaction, the row is created on the first one
+        if self._flip(user, post, interaction, True):
+            return True
+        if self._flip(user, post, interaction, False):
+            return False
+        if not create:
+            # only when the row was deleted in between, along with its post or user
+            raise ValidationError("The post was changed concurrently, try again.")
+        with atomic():
+            self.create(user=user, post=post, **{interaction: True})
+        return True
+
+    @atomic
+    def toggle(self, user, post_id, interaction):
+        """
+        Toggles the like or report of the user on a post of a connected user, along with
+        the counter of the post and the notification of its author, in a constant number
+        of statements. Returns the post, with its counters as updated.
+        """
+        # imported here, the models depend on the managers
+        from .models import Connection, Notification, Post
+
+        if interaction not in self.COUNTERS:
+            raise ValidationError(f"Unknown interaction {interaction}.")
+
+        # the post, its author for the notification, and whether they are connected at once
+        post = (
+            Post.objects.select_related("user")
+            .annotate(
+                connected=Connection.objects.connected_expression(user, OuterRef("user"))
+            )
+            .get(id=post_id)
+        )
+        if not post.connected:
+            raise ValidationError("Can't interact with posts of unconnected users.")
+
+        try:
+            value = self._toggle_row(user, post, interaction)
+        except IntegrityError:
+            # the row was created concurrently, it is there to toggle now
+            value = self._toggle_row(user, post, interaction, create=False)
+
+        Post.objects.add_to_counter(post.id, self.COUNTERS[interaction], 1 if value else -1)
+        if value:
+            create_notification = {
+                "like": Notification.objects.create_like_notification,
+                "report": Notification.objects.create_report_notification,
+            }[interaction]
+            create_notification(user, post)
+        else:
+            Notification.objects.delete_notification(interaction, user, post)
+
+        post.refresh_from_db(fields=["likes", "reports"])
+        return post
 
 
 class ConnectionManager(models.Manager):
@@ -11,78 +134,168 @@ class ConnectionManager(models.Manager):
     any interaction with the Connection models, no other interaction is allowed.
     """
 
+    def _edges(self):
+        # ConnectionEdge is declared after Connection, reach it through the reverse relation
+        return self.model.edges.rel.related_model.objects
+
+    def _useraccounts(self):
+        return self.model.users.field.related_model.objects
+
     @atomic
     def create_connection_request(self, sender, receiver):
         if sender == receiver:
             raise ValidationError("Both users can't be same.")
 
-        connections = (
-            self.get_queryset()
-            .filter(users=sender)
-            .filter(users=receiver)
-            .filter(sent_by=sender)
-            .distinct()
-        )
-
-        if not connections.exists():
-            connection_request = self.create(sent_by=sender)
-            connection_request.users.add(sender)
-            connection_request.users.add(receiver)
-            return connection_request
+        edge_model = self._edges().model
+        try:
+            # the adjacency rows are unique per pair of users, so the edges of a request
+            # between them already, sent either way, fail to insert
+            with atomic():
+                connection_request = self.create(sent_by=sender)
+                self._edges().bulk_create(
+                    [
+                        edge_model(
+                            connection=connection_request,
+                            user=sender,
+                            peer=receiver,
+                            state="sent",
+                        ),
+                        edge_model(
+                            connection=connection_request,
+                            user=receiver,
+                            peer=sender,
+                            state="received",
+                        ),
+                    ]
+                )
+        except IntegrityError:
+            return (
+                self._edges()
+                .select_related("connection")
+                .get(user=sender, peer=receiver)
+                .connection
+            )
 
-        return connections.first()
+        through = self.model.users.through
+        through.objects.bulk_create(
+            [
+                through(connection_id=connection_request.id, useraccount_id=sender.id),
+                through(connection_id=connection_request.id, useraccount_id=receiver.id),
+            ]
+        )
+        return connection_request
+
+    def _connections_counts(self, *users):
+        # read after the update, in the same transaction, so that a single one of
+        # concurrent connection changes sees the count crossing a threshold
+        return dict(
+            self._useraccounts()
+            .filter(id__in=[user.id for user in users])
+            .values_list("id", "connections_count")
+        )
 
     @atomic
     def accept_decline(self, sender, receiver, accept=False):
-        connections = (
-            self.get_queryset()
-            .filter(users=sender)
-            .filter(users=receiver)
-            .filter(sent_by=sender)
-            .filter(accepted=False)
-            .distinct()
+        edge = (
+            self._edges()
+            .select_related("connection")
+            .filter(user=receiver, peer=sender, state="received")
+            .first()
         )
 
-        if connections.exists():
-            selected_connection = connections.first()
+        if edge is not None:
+            selected_connection = edge.connection
             if accept:
                 selected_connection.accepted = True
                 selected_connection.save()
+                self._edges().filter(connection=selected_connection).update(
+                    state="accepted"
+                )
+                self._useraccounts().filter(id__in=[sender.id, receiver.id]).update(
+                    connections_count=F("connections_count") + 1
+                )
+                connections_counts = self._connections_counts(sender, receiver)
+
+                # imported here, the timelines module depends on the models
+                from . import timelines
 
-            elif not selected_connection.accepted:
+                on_commit(
+                    lambda: timelines.connect(sender, receiver, connections_counts)
+                )
+
+            else:
+                # the edges go along with the connection
                 selected_connection.delete()
 
         else:
             raise ObjectDoesNotExist("No such connection request exists")
 
+    @atomic
     def delete_connection(self, sender, receiver, connected=True):
         # in case a user changes their mind to send the request through
-        connections = (
-            self.get_queryset()
-            .filter(users=sender)
-            .filter(users=receiver)
-            .filter(accepted=connected)
-            .distinct()
-        )
+        edges = self._edges().filter(user=sender, peer=receiver)
+        if connected:
+            edges = edges.filter(state="accepted")
+        else:
+            edges = edges.exclude(state="accepted")
 
-        if connections.exists():
-            connections.first().delete()
+        edge = edges.select_related("connection").first()
+        if edge is not None:
+            edge.connection.delete()
 
-    def get_connected_users(self, user):
-        connections = self.get_queryset().filter(users__in=[user], accepted=True)
-        if not connections.exists():
-            return None
+            if connected:
+                self._useraccounts().filter(
+                    id__in=[sender.id, receiver.id], connections_count__gt=0
+                ).update(connections_count=F("connections_count") - 1)
+                connections_counts = self._connections_counts(sender, receiver)
 
-        connected_users = []
+                from . import timelines
+                from .realtime import publish_connection_removed
 
-        for connection in connections:
-            users = connection.users.all()
-            connected_user = ((users.first() != user) and users.first()) or (
-                (users.last() != user) and users.last()
-            )
-            connected_users.append(connected_user)
+                on_commit(
+                    lambda: timelines.disconnect(sender, receiver, connections_counts)
+                )
+                on_commit(lambda: publish_connection_removed(sender.id, receiver.id))
+
+    def are_connected(self, user, other):
+        """
+        Whether the two users are connected, as a single index seek on the adjacency table.
+        """
+        return self._edges().filter(user=user, peer=other, state="accepted").exists()
+
+    def connected_expression(self, user, other):
+        """
+        EXISTS expression of are_connected, to annotate with. other is typically an OuterRef,
+        e.g. to the author of the annotated posts.
+        """
+        return Exists(self._edges().filter(user=user, peer=other, state="accepted"))
+
+    def connected_user_ids(self, user):
+        """
+        Lazy queryset of the ids of all the users connected to the given user,
+        resolved with a single index seek on the adjacency table.
+        Wrap it in a set for membership checks, or use it as a subquery.
+        """
+        return (
+            self._edges()
+            .filter(user=user, state="accepted")
+            .values_list("peer_id", flat=True)
+        )
+
+    def pending_requests(self, user):
+        """
+        Pending connection requests sent or received by the user, for
+        ConnectionRequestListAPI. Meant to be listed as
+        .values_list(*representations.CONNECTION.lookups) rows, which join the profile
+        of the sender by themselves.
+        """
+        return self.get_queryset().filter(users=user, accepted=False)
 
-        return connected_users
+    def get_connected_users(self, user):
+        """
+        Lazy queryset of the UserAccounts connected to the given user.
+        """
+        return self._useraccounts().filter(id__in=self.connected_user_ids(user))
 
 
 class NotificationManager(models.Manager):
@@ -113,97 +326,137 @@ class NotificationManager(models.Manager):
 
     """
 
-    @atomic
-    def create_like_notification(self, sender, post):
-        receiver = post.user
-        notifications = self.get_queryset().filter(
-            notification_type="like", sent_by=sender, sent_to__in=[receiver], post=post
+    def _useraccounts(self):
+        return self.model.sent_to.field.related_model.objects
+
+    def received_by(self, user):
+        """
+        The notifications received by the user, as the rows of the through table along with
+        their notification and its post. Ordered by notification_id, they are read in the
+        order of the (useraccount, notification) index, without sorting the whole inbox.
+        """
+        return self.model.sent_to.through.objects.filter(
+            useraccount=user
+        ).select_related("notification__post")
+
+    def _publish(self, notification, receiver_ids):
+        # imported here, the realtime module depends on the serializers and so on the models
+        from .realtime import publish_notification
+
+        receiver_ids = list(receiver_ids)
+        self._useraccounts().filter(id__in=receiver_ids).update(
+            unread_notifications_count=F("unread_notifications_count") + 1
         )
+        on_commit(lambda: publish_notification(notification, receiver_ids))
 
-        if not notifications.exists():
-            text = random.choice(self.LIKE_TEXT_CHOICES).format(
-                s=sender.first_name, r=receiver.first_name, p=post
-            )
-            like_notification = self.create(
-                notification_type="like", sent_by=sender, post=post, text=text
+    @atomic
+    def mark_read(self, user, last_read_id=None):
+        """
+        Marks the notifications of the user up to last_read_id (all of them by default) as read.
+        """
+        notifications = self.get_queryset().filter(sent_to=user)
+        if last_read_id is None:
+            last_read_id = (
+                notifications.order_by("-id").values_list("id", flat=True).first() or 0
             )
-            like_notification.sent_to.add(receiver)
 
-            return like_notification
+        last_read_id = max(last_read_id, user.last_read_notification_id)
+        self._useraccounts().filter(id=user.id).update(
+            last_read_notification_id=last_read_id,
+            unread_notifications_count=notifications.filter(id__gt=last_read_id).count(),
+        )
 
-        return notifications.first()
+    def _create_once(self, notification_type, sender, post, text):
+        """
+        Inserts the notification of the sender about the post, unless they already have one
+        of the type, which the unique constraint of the model rejects.
+        Returns the notification and whether it was created.
+        """
+        try:
+            with atomic():
+                notification = self.create(
+                    notification_type=notification_type, sent_by=sender, post=post, text=text
+                )
+            return notification, True
+        except IntegrityError:
+            notification = self.get_queryset().get(
+                notification_type=notification_type, sent_by=sender, post=post
+            )
+            return notification, False
+
+    def _add_receivers(self, notification, receiver_ids):
+        through = self.model.sent_to.through
+        through.objects.bulk_create(
+            [
+                through(notification_id=notification.id, useraccount_id=receiver_id)
+                for receiver_id in receiver_ids
+            ],
+            ignore_conflicts=True,
+        )
+        self._publish(notification, receiver_ids)
 
-    @atomic
-    def create_share_notification(self, sender, post):
+    def _create_interaction_notification(self, notification_type, text_choices, sender, post):
+        # sent to the author of the post alone
         receiver = post.user
-        notifications = self.get_queryset().filter(
-            notification_type="share", sent_by=sender, sent_to__in=[receiver], post=post
+        text = random.choice(text_choices).format(
+            s=sender.first_name, r=receiver.first_name, p=post
         )
 
-        if not notifications.exists():
-            text = random.choice(self.SHARE_TEXT_CHOICES).format(
-                s=sender.first_name, r=receiver.first_name, p=post
-            )
-            share_notification = self.create(
-                notification_type="share", sent_by=sender, post=post, text=text
-            )
-            share_notification.sent_to.add(receiver)
-
-            return share_notification
+        notification, created = self._create_once(notification_type, sender, post, text)
+        if created:
+            self._add_receivers(notification, [receiver.id])
 
-        return notifications.first()
+        return notification
 
     @atomic
-    def create_report_notification(self, sender, post):
-        receiver = post.user
-        notifications = self.get_queryset().filter(
-            notification_type="report",
-            sent_by=sender,
-            sent_to__in=[receiver],
-            post=post,
+    def create_like_notification(self, sender, post):
+        return self._create_interaction_notification(
+            "like", self.LIKE_TEXT_CHOICES, sender, post
         )
 
-        if not notifications.exists():
-            text = random.choice(self.REPORT_TEXT_CHOICES).format(
-                s=sender.first_name, r=receiver.first_name, p=post
-            )
-            report_notification = self.create(
-                notification_type="report", sent_by=sender, post=post, text=text
-            )
-            report_notification.sent_to.add(receiver)
-
-            return report_notification
+    @atomic
+    def create_share_notification(self, sender, post):
+        return self._create_interaction_notification(
+            "share", self.SHARE_TEXT_CHOICES, sender, post
+        )
 
-        return notifications.first()
+    @atomic
+    def create_report_notification(self, sender, post):
+        return self._create_interaction_notification(
+            "report", self.REPORT_TEXT_CHOICES, sender, post
+        )
 
     @atomic
     def create_post_notification(self, receivers, post):
         sender = post.user
-        notifications = self.get_queryset().filter(
-            notification_type="post", sent_by=sender, post=post
-        )
+        text = random.choice(self.POST_TEXT_CHOICES).format(s=sender.first_name, p=post)
 
-        if not notifications.exists():
-            if post.user == sender:
-                text = random.choice(self.POST_TEXT_CHOICES).format(
-                    s=sender.first_name, p=post
-                )
+        post_notification, created = self._create_once("post", sender, post, text)
+        if created:
+            # receivers can be given as UserAccounts or as their ids
+            receiver_ids = [getattr(receiver, "id", receiver) for receiver in receivers]
 
-                post_notification = self.create(
-                    notification_type="post",
-                    sent_by=sender,
-                    post=post,
-                    text=text,
-                )
-
-                for receiver in receivers:
-                    post_notification.sent_to.add(receiver)
+            threshold = settings.NOTIFICATION_FANOUT_DEFER_THRESHOLD
+            if threshold and len(receiver_ids) > threshold:
+                # imported here, the workers are only needed for large audiences
+                from .workers import submit
 
-                return post_notification
+                on_commit(lambda: submit(self.fan_out, post_notification, receiver_ids))
             else:
-                raise ValidationError("Can't send report notification to a third user.")
+                self.fan_out(post_notification, receiver_ids)
+
+        return post_notification
+
+    def fan_out(self, notification, receiver_ids):
+        """
+        Adds the receivers to the notification with batched inserts into the through table,
+        each batch in its own transaction unless already running in one.
+        """
+        batch_size = settings.NOTIFICATION_FANOUT_BATCH_SIZE
 
-        return notifications.first()
+        for index in range(0, len(receiver_ids), batch_size):
+            with atomic():
+                self._add_receivers(notification, receiver_ids[index : index + batch_size])
 
     @atomic
     def delete_notification(self, notification_type, sender, post):
@@ -233,5 +486,18 @@ class NotificationManager(models.Manager):
                 notification_type="post", sent_by=sender, post=post
             )
 
-        if notifications.exists():
-            notifications.first().delete()
+        notification = notifications.first()
+        if notification is not None:
+            # the unread counters are decremented by the pre_delete receiver of the model
+            notification.delete()
+
+    def discount_unread(self, notification):
+        """
+        Decrements the unread counters of the receivers who haven't read the notification,
+        when it is deleted, along with its post or its sender too.
+        """
+        self._useraccounts().filter(
+            notifications=notification,
+            last_read_notification_id__lt=notification.id,
+            unread_notifications_count__gt=0,
+        ).update(unread_notifications_count=F("unread_notifications_count") - 1)
@@ -0,0 +1,150 @@
+"""
+Background generation of the image renditions of the uploaded media.
+
+Post media are stored as uploaded, display pictures within their 300x300 bound, and the renditions listed in MEDIA_RENDITIONS (name -> the
+largest side in pixels) are generated on the worker pool once the upload is committed,
+encoded as MEDIA_RENDITION_FORMAT. Until then, and for media that isn't an image, only
+the original is listed. The renditions of a model are kept in its *_renditions field as
+a dict of rendition name -> storage name, the original included, so renditions
+left from a previous upload are told apart by their original.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.transaction import on_commit
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .workers import submit
+
+
+ORIGINAL = "original"
+
+EXTENSIONS = {"WEBP": "webp", "AVIF": "avif", "JPEG": "jpg", "PNG": "png"}
+
+
+def rendition_name(name, rendition):
+    root, _ = os.path.splitext(name)
+    directory, filename = os.path.split(root)
+    extension = EXTENSIONS.get(settings.MEDIA_RENDITION_FORMAT, "img")
+    return os.path.join(directory, "renditions", f"{filename}_{rendition}.{extension}")
+
+
+def render(field_file):
+    """
+    Generates and stores the renditions of an image file, returning the dict of their storage names.
+    Files that aren't images only get their original listed.
+    """
+    renditions = {ORIGINAL: field_file.name}
+    try:
+        with field_file.open("rb") as image_file:
+            image = Image.open(image_file)
+            image.load()
+    except (UnidentifiedImageError, OSError):
+        return renditions
+
+    # follows the camera orientation, which is dropped with the rest of the metadata
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    for rendition, size in settings.MEDIA_RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        if settings.MEDIA_RENDITION_FORMAT == "JPEG" and resized.mode == "RGBA":
+            resized = resized.convert("RGB")
+
+        output = BytesIO()
+        resized.save(
+            output,
+            settings.MEDIA_RENDITION_FORMAT,
+            quality=settings.MEDIA_RENDITION_QUALITY,
+        )
+        renditions[rendition] = default_storage.save(
+            rendition_name(field_file.name, rendition), ContentFile(output.getvalue())
+        )
+
+    return renditions
+
+
+def _process(model, pk, field, renditions_field):
+    instance = model.objects.filter(pk=pk).only(field, renditions_field).first()
+    if instance is None:
+        return None
+
+    field_file = getattr(instance, field)
+    try:
+        exists = bool(field_file) and default_storage.exists(field_file.name)
+    except SuspiciousFileOperation:
+        # outside of the media storage, e.g. the default display picture
+        exists = False
+    if not exists:
+        return None
+
+    renditions = render(field_file)
+    updated = model.objects.filter(pk=pk, **{field: field_file.name}).update(
+        **{renditions_field: renditions}
+    )
+
+    if updated:
+        # the renditions of the previous upload
+        stale = getattr(instance, renditions_field)
+    else:
+        # another upload replaced the file meanwhile, its own task renders it
+        stale, renditions = renditions, None
+    for rendition, name in stale.items():
+        if rendition != ORIGINAL:
+            default_storage.delete(name)
+
+    return renditions
+
+
+def process_post_media(post_id):
+    from .models import Post
+
+    return _process(Post, post_id, "media", "media_renditions")
+
+
+def process_display_picture(useraccount_id):
+    from .models import UserAccount
+    from .profile_cache import invalidate_profile
+
+    renditions = _process(
+        UserAccount, useraccount_id, "display_picture", "display_picture_renditions"
+    )
+    if renditions:
+        invalidate_profile(useraccount_id)
+    return renditions
+
+
+def schedule_renditions(process, pk):
+    """
+    Runs process(pk) on the worker pool once the current transaction commits,
+    or right away when MEDIA_RENDITIONS_ASYNC is off.
+    """
+    if settings.MEDIA_RENDITIONS_ASYNC:
+        on_commit(lambda: submit(process, pk))
+    else:
+        on_commit(lambda: process(pk))
+
+
+def is_rendered(field_file, renditions):
+    # the storage name itself may be given, e.g. as read with .values()
+    name = getattr(field_file, "name", field_file)
+    return bool(name) and renditions.get(ORIGINAL) == name
+
+
+def urls(field_file, renditions):
+    """
+    URLs of the renditions of the file, or of its storage name, only the original until they are generated.
+    """
+    name = getattr(field_file, "name", field_file)
+    if not name:
+        return {}
+    if not is_rendered(name, renditions):
+        renditions = {ORIGINAL: name}
+
+    return {rendition: default_storage.url(name) for rendition, name in renditions.items()}
@@ -0,0 +1,266 @@
+"""
+In-process request metrics, recorded by main.middleware.MetricsMiddleware when METRICS_ENABLED.
+
+For every resolved endpoint, histograms of the request latency, the number and time of the
+database queries, the time spent serializing and the response size are kept in memory.
+Every process writes a snapshot of its own histograms to METRICS_DIR at most every
+METRICS_FLUSH_INTERVAL seconds, where the metrics endpoint and the dump_metrics command
+merge the snapshots of all the processes.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+# upper bounds of the histogram buckets, the last one catches everything above
+LATENCY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, math.inf)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, math.inf)
+SIZE_BUCKETS = (
+    1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20, math.inf
+)
+
+HISTOGRAMS = {
+    "latency_ms": LATENCY_BUCKETS,
+    "query_count": QUERY_COUNT_BUCKETS,
+    "query_ms": LATENCY_BUCKETS,
+    "serializer_ms": LATENCY_BUCKETS,
+    "response_bytes": SIZE_BUCKETS,
+}
+
+
+class Histogram(object):
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other["counts"])]
+        self.count += other["count"]
+        self.sum += other["sum"]
+        self.max = max(self.max, other["max"])
+
+    def percentile(self, fraction):
+        """
+        Upper bound of the bucket holding the given fraction of the observations,
+        capped at the largest observed value.
+        """
+        if not self.count:
+            return 0
+
+        rank = math.ceil(fraction * self.count)
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"counts": self.counts, "count": self.count, "sum": self.sum, "max": self.max}
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 3) if self.count else 0,
+            "p50": round(self.percentile(0.5), 3),
+            "p90": round(self.percentile(0.9), 3),
+            "p99": round(self.percentile(0.99), 3),
+            "max": round(self.max, 3),
+        }
+
+
+class EndpointMetrics(object):
+    def __init__(self):
+        self.histograms = {
+            name: Histogram(bounds) for name, bounds in HISTOGRAMS.items()
+        }
+        self.statuses = defaultdict(int)
+        self.duplicate_query_requests = 0
+
+    def merge(self, other):
+        for name, histogram in other["histograms"].items():
+            self.histograms[name].merge(histogram)
+        for status, count in other["statuses"].items():
+            self.statuses[str(status)] += count
+        self.duplicate_query_requests += other["duplicate_query_requests"]
+
+    def to_dict(self):
+        return {
+            "histograms": {
+                name: histogram.to_dict() for name, histogram in self.histograms.items()
+            },
+            "statuses": dict(self.statuses),
+            "duplicate_query_requests": self.duplicate_query_requests,
+        }
+
+    def summary(self):
+        summary = {
+            name: histogram.summary() for name, histogram in self.histograms.items()
+        }
+        summary["statuses"] = dict(self.statuses)
+        summary["duplicate_query_requests"] = self.duplicate_query_requests
+        return summary
+
+
+class RequestMetrics(object):
+    """
+    What is measured of a single request while it is being handled.
+    """
+
+    def __init__(self):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.statements = defaultdict(int)
+
+    def record_query(self, sql, duration):
+        self.query_count += 1
+        self.query_time += duration
+        self.statements[sql] += 1
+
+    def duplicate_statements(self, threshold):
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+
+class Registry(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = defaultdict(EndpointMetrics)
+        self.last_flush = None
+
+    def record(
+        self, endpoint, status, latency, request_metrics, response_size, duplicated=False
+    ):
+        with self.lock:
+            metrics = self.endpoints[endpoint]
+            histograms = metrics.histograms
+            histograms["latency_ms"].observe(latency * 1000)
+            histograms["query_count"].observe(request_metrics.query_count)
+            histograms["query_ms"].observe(request_metrics.query_time * 1000)
+            histograms["serializer_ms"].observe(request_metrics.serializer_time * 1000)
+            histograms["response_bytes"].observe(response_size)
+            metrics.statuses[str(status)] += 1
+            if duplicated:
+                metrics.duplicate_query_requests += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                endpoint: metrics.to_dict() for endpoint, metrics in self.endpoints.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+
+    def flush(self, directory, interval=0):
+        """
+        Writes the snapshot of this process to directory, unless it was written less than interval seconds ago.
+        """
+        now = time.monotonic()
+        if self.last_flush is not None and now - self.last_flush < interval:
+            return
+        self.last_flush = now
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        # written aside and renamed, so readers never see a partial snapshot
+        with open(f"{path}.tmp", "w") as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(f"{path}.tmp", path)
+
+
+registry = Registry()
+
+_local = threading.local()
+
+
+def start_request():
+    _local.request_metrics = RequestMetrics()
+    return _local.request_metrics
+
+
+def end_request():
+    _local.request_metrics = None
+
+
+def current_request():
+    return getattr(_local, "request_metrics", None)
+
+
+def load(directory):
+    """
+    Merges the snapshots of all the processes found in directory, returning a dict of EndpointMetrics.
+    """
+    endpoints = defaultdict(EndpointMetrics)
+    if not os.path.isdir(directory):
+        return endpoints
+
+    for filename in os.listdir(directory):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError):
+            # removed or being replaced meanwhile
+            continue
+        for endpoint, metrics in snapshot.items():
+            endpoints[endpoint].merge(metrics)
+
+    return endpoints
+
+
+def clear(directory):
+    registry.reset()
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if filename.endswith(".json"):
+                os.remove(os.path.join(directory, filename))
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Adds the time spent within to the serializer time of the current request.
+    Only the outermost block is timed, nested ones are part of its time.
+    """
+    request_metrics = current_request()
+    if request_metrics is None or request_metrics.serializer_depth:
+        yield
+        return
+
+    request_metrics.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics.serializer_time += time.perf_counter() - started
+        request_metrics.serializer_depth -= 1
+
+
+class SerializerTimingMixin(object):
+    """
+    Adds the time spent in to_representation to the metrics of the current request.
+    """
+
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
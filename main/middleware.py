@@ -0,0 +1,74 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware(object):
+    """
+    Records the latency, database queries, serializer time and response size of every request
+    against its resolved URL name, see main.metrics.
+    Requests running the same SQL statement METRICS_DUPLICATE_QUERY_THRESHOLD times or more
+    are logged as likely N+1 queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = metrics.start_request()
+
+        def record_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                request_metrics.record_query(sql, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            metrics.end_request()
+        latency = time.perf_counter() - started
+
+        endpoint = self.get_endpoint(request)
+        duplicates = request_metrics.duplicate_statements(
+            settings.METRICS_DUPLICATE_QUERY_THRESHOLD
+        )
+        for sql, count in duplicates.items():
+            logger.warning(
+                "Possible N+1 queries on %s: the same statement ran %d times: %s",
+                endpoint,
+                count,
+                sql,
+            )
+
+        metrics.registry.record(
+            endpoint,
+            response.status_code,
+            latency,
+            request_metrics,
+            0 if response.streaming else len(response.content),
+            duplicated=bool(duplicates),
+        )
+        metrics.registry.flush(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
+
+        return response
+
+    def get_endpoint(self, request):
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return f"{request.method} <unresolved>"
+
+        return f"{request.method} {match.view_name or match.route}"
@@ -0,0 +1,35 @@
+# Generated by Django 3.1.5 on 2026-10-18 16:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_auto_20210328_0115'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConnectionEdge',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('sent', 'sent'), ('received', 'received'), ('accepted', 'accepted')], max_length=10)),
+                ('connection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges', to='main.connection')),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.useraccount')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='connection_edges', to='main.useraccount')),
+            ],
+            options={
+                'verbose_name': 'Connection Edge',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='connectionedge',
+            index=models.Index(fields=['user', 'state', 'peer'], name='main_connec_user_id_2968d5_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='connectionedge',
+            unique_together={('user', 'peer')},
+        ),
+    ]
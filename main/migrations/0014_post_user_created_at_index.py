@@ -0,0 +1,17 @@
+# Generated by Django 3.1.5 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_connectionedge'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', 'created_at'], name='main_post_user_id_a9c09f_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.1.5 on 2026-10-18 16:38
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def count_connections(apps, schema_editor):
+    UserAccount = apps.get_model("main", "UserAccount")
+    Connection = apps.get_model("main", "Connection")
+
+    counts = (
+        Connection.users.through.objects.filter(connection__accepted=True)
+        .values("useraccount_id")
+        .annotate(count=Count("connection_id"))
+    )
+    for row in counts:
+        UserAccount.objects.filter(id=row["useraccount_id"]).update(
+            connections_count=row["count"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_post_user_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraccount',
+            name='connections_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_connections, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.useraccount')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='main.useraccount')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.post')),
+            ],
+            options={
+                'verbose_name': 'Timeline Entry',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', 'created_at', 'post'], name='main_timeli_owner_i_c33b09_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', 'author'], name='main_timeli_owner_i_1b286e_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timelineentry',
+            unique_together={('owner', 'post')},
+        ),
+    ]
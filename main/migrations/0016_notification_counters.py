@@ -0,0 +1,34 @@
+# Generated by Django 3.1.5 on 2026-10-18 16:40
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def mark_existing_read(apps, schema_editor):
+    # the counters start at zero, so the notifications sent so far are taken as read
+    UserAccount = apps.get_model("main", "UserAccount")
+    Notification = apps.get_model("main", "Notification")
+
+    last_id = Notification.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+    UserAccount.objects.update(last_read_notification_id=last_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraccount',
+            name='last_read_notification_id',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='useraccount',
+            name='unread_notifications_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(mark_existing_read, migrations.RunPython.noop),
+    ]
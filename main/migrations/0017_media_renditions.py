@@ -0,0 +1,29 @@
+# Generated by Django 3.1.5 on 2026-10-18 17:01
+
+from django.db import migrations, models
+import main.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_notification_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='media_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='useraccount',
+            name='display_picture_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='useraccount',
+            name='display_picture',
+            field=models.ImageField(blank=True, default='/app/static/images/default_dp.png', upload_to=main.models.get_dp_path),
+        ),
+    ]
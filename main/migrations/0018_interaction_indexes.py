@@ -0,0 +1,39 @@
+# Generated by Django 3.1.5 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+# the many to many tables are created by Django, their indexes are added on them directly
+THROUGH_INDEXES = (
+    # the connections of a user, e.g. their pending requests, read from the index alone
+    ("Connection", "users", ["useraccount", "connection"], "main_conn_users_user_conn_idx"),
+    # the notifications received by a user, newest first
+    ("Notification", "sent_to", ["useraccount", "notification"], "main_notif_to_user_notif_idx"),
+)
+
+
+def add_through_indexes(apps, schema_editor):
+    for model_name, field_name, fields, name in THROUGH_INDEXES:
+        through = apps.get_model("main", model_name)._meta.get_field(field_name).remote_field.through
+        schema_editor.add_index(through, models.Index(fields=fields, name=name))
+
+
+def remove_through_indexes(apps, schema_editor):
+    for model_name, field_name, fields, name in THROUGH_INDEXES:
+        through = apps.get_model("main", model_name)._meta.get_field(field_name).remote_field.through
+        schema_editor.remove_index(through, models.Index(fields=fields, name=name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_media_renditions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['notification_type', 'sent_by', 'post'], name='main_notifi_notific_358f68_idx'),
+        ),
+        migrations.RunPython(add_through_indexes, remove_through_indexes),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 3.1.5 on 2026-10-18 17:09
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_notifications(apps, schema_editor):
+    # the oldest notification of every type, sender and post is kept, with the receivers of the others
+    UserAccount = apps.get_model("main", "UserAccount")
+    Notification = apps.get_model("main", "Notification")
+    through = Notification.sent_to.through
+
+    duplicated = (
+        Notification.objects.values("notification_type", "sent_by", "post")
+        .annotate(count=Count("id"), kept_id=Min("id"))
+        .filter(count__gt=1)
+    )
+    affected_user_ids = set()
+    for group in duplicated:
+        duplicate_ids = list(
+            Notification.objects.filter(
+                notification_type=group["notification_type"],
+                sent_by=group["sent_by"],
+                post=group["post"],
+            )
+            .exclude(id=group["kept_id"])
+            .values_list("id", flat=True)
+        )
+        receiver_ids = set(
+            through.objects.filter(notification_id__in=duplicate_ids).values_list(
+                "useraccount_id", flat=True
+            )
+        )
+        through.objects.bulk_create(
+            [
+                through(notification_id=group["kept_id"], useraccount_id=receiver_id)
+                for receiver_id in receiver_ids
+            ],
+            ignore_conflicts=True,
+        )
+        Notification.objects.filter(id__in=duplicate_ids).delete()
+        affected_user_ids |= receiver_ids
+
+    # the unread counters of the receivers counted the removed notifications too
+    for useraccount in UserAccount.objects.filter(id__in=affected_user_ids):
+        useraccount.unread_notifications_count = through.objects.filter(
+            useraccount_id=useraccount.id,
+            notification_id__gt=useraccount.last_read_notification_id,
+        ).count()
+        useraccount.save(update_fields=["unread_notifications_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_interaction_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_notifications, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='main_notifi_notific_358f68_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('notification_type', 'sent_by', 'post'), name='unique_notification_per_interaction'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.1.5 on 2026-10-18 18:02
+
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_connection_edges(apps, schema_editor):
+    # the edges of the connections made before the adjacency table existed,
+    # as the backfill_connection_edges command builds them
+    Connection = apps.get_model("main", "Connection")
+    ConnectionEdge = apps.get_model("main", "ConnectionEdge")
+    through = Connection.users.through
+
+    connections = Connection.objects.order_by("id").values_list(
+        "id", "sent_by_id", "accepted"
+    )
+
+    last_id = 0
+    while True:
+        batch = list(connections.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        users = {}
+        for connection_id, useraccount_id in through.objects.filter(
+            connection_id__in=[connection_id for connection_id, _, _ in batch]
+        ).values_list("connection_id", "useraccount_id"):
+            users.setdefault(connection_id, []).append(useraccount_id)
+
+        edges = []
+        for connection_id, sent_by_id, accepted in batch:
+            pair = users.get(connection_id, [])
+            if len(pair) != 2 or sent_by_id not in pair:
+                # malformed, left to the command to report
+                continue
+
+            receiver_id = pair[0] if pair[1] == sent_by_id else pair[1]
+            edges.append(
+                ConnectionEdge(
+                    connection_id=connection_id,
+                    user_id=sent_by_id,
+                    peer_id=receiver_id,
+                    state="accepted" if accepted else "sent",
+                )
+            )
+            edges.append(
+                ConnectionEdge(
+                    connection_id=connection_id,
+                    user_id=receiver_id,
+                    peer_id=sent_by_id,
+                    state="accepted" if accepted else "received",
+                )
+            )
+
+        # rows already present for a pair are kept as they are
+        ConnectionEdge.objects.bulk_create(edges, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_unique_notifications'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_connection_edges, migrations.RunPython.noop),
+    ]
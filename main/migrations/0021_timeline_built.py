@@ -0,0 +1,31 @@
+# Generated by Django 3.1.5 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+def mark_empty_timelines_built(apps, schema_editor):
+    # without connections there is nothing to rebuild, their connections backfill it
+    UserAccount = apps.get_model("main", "UserAccount")
+    UserAccount.objects.filter(connections_count=0).update(timeline_built=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_backfill_connection_edges'),
+    ]
+
+    operations = [
+        # the existing accounts have no timeline yet, the new ones start with an empty one
+        migrations.AddField(
+            model_name='useraccount',
+            name='timeline_built',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='useraccount',
+            name='timeline_built',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.RunPython(mark_empty_timelines_built, migrations.RunPython.noop),
+    ]
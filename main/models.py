@@ -1,5 +1,7 @@
 import os
 from django.db import models
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django_resized import ResizedImageField
 from django.core.validators import RegexValidator
@@ -10,7 +12,18 @@ from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from datetime import date
 
-from .managers import ConnectionManager, NotificationManager
+from .media import (
+    process_display_picture,
+    process_post_media,
+    schedule_renditions,
+)
+from .managers import (
+    ConnectionManager,
+    NotificationManager,
+    PostInteractionManager,
+    PostManager,
+)
+from .profile_cache import invalidate_profile
 
 
 def get_dp_path(instance, filename):
@@ -21,6 +34,27 @@ def get_media_path(instance, filename):
     return f"media/user/{slugify(instance.user.username)}/post/{filename}"
 
 
+def _save_kwargs_without(instance, fields, kwargs):
+    """
+    Full saves of a loaded instance leave out the given fields, which are only changed with
+    UPDATEs such as F() increments, so that they don't write back the values read over the
+    updates committed since.
+    """
+    if (
+        instance._state.adding
+        or kwargs.get("force_insert")
+        or kwargs.get("update_fields") is not None
+    ):
+        return kwargs
+
+    kwargs["update_fields"] = [
+        field.name
+        for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in fields
+    ]
+    return kwargs
+
+
 class TrackingModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -63,6 +97,7 @@ class UserAccount(TrackingModel):
         max_length=13, validators=[RegexValidator(r"^(\+91|0|91)?[6789]([0-9]{9})$")]
     )
 
+    # kept bounded for the clients reading it, the renditions are made in the background, see main.media
     display_picture = ResizedImageField(
         upload_to=get_dp_path,
         size=[300, 300],
@@ -70,6 +105,9 @@ class UserAccount(TrackingModel):
         blank=True,
         default=os.path.join(settings.STATIC_ROOT, "images/default_dp.png"),
     )
+    display_picture_renditions = models.JSONField(
+        default=dict, blank=True, editable=False
+    )
 
     date_of_birth = models.DateField(blank=False, null=False)
 
@@ -77,6 +115,26 @@ class UserAccount(TrackingModel):
 
     profile_summary = models.TextField(max_length=300, blank=True, null=True)
 
+    # maintained by the ConnectionManager, used to pick the feed fan-out strategy
+    connections_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # maintained by the NotificationManager, so that the unread count needs no COUNT(*)
+    unread_notifications_count = models.PositiveIntegerField(default=0, editable=False)
+    last_read_notification_id = models.PositiveIntegerField(default=0, editable=False)
+
+    # False for the accounts older than the feed timelines until theirs is rebuilt,
+    # their feed is pulled from the posts meanwhile, see main.timelines
+    timeline_built = models.BooleanField(default=True, editable=False)
+
+    # changed with UPDATEs alone, by the managers, timelines and background renditions
+    update_only_fields = (
+        "connections_count",
+        "unread_notifications_count",
+        "last_read_notification_id",
+        "display_picture_renditions",
+        "timeline_built",
+    )
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
@@ -90,6 +148,15 @@ class UserAccount(TrackingModel):
         if (today - self.date_of_birth).days // 365 < 18:
             raise ValidationError(_("User can't be below the age of 18"))
 
+    def save(self, *args, **kwargs):
+        # a new upload isn't committed to the storage until saved
+        uploaded = bool(self.display_picture) and not self.display_picture._committed
+        kwargs = _save_kwargs_without(self, self.update_only_fields, kwargs)
+        super().save(*args, **kwargs)
+        invalidate_profile(self.id)
+        if uploaded:
+            schedule_renditions(process_display_picture, self.id)
+
     class Meta:
         verbose_name = "User Account"
 
@@ -100,11 +167,17 @@ class Post(TrackingModel):
     text = models.TextField(max_length=300, blank=True, null=True)
 
     media = models.FileField(upload_to=get_media_path, null=True, blank=True)
+    media_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     likes = models.PositiveIntegerField(default=0)
 
     reports = models.PositiveIntegerField(default=0)
 
+    objects = PostManager()
+
+    # changed with UPDATEs alone, by the PostManager and the background renditions
+    update_only_fields = ("likes", "reports", "media_renditions")
+
     @property
     def username(self):
         return self.user.username
@@ -112,6 +185,16 @@ class Post(TrackingModel):
     def __str__(self):
         return f"[{self.user.first_name}]-{self.text}"
 
+    def save(self, *args, **kwargs):
+        uploaded = bool(self.media) and not self.media._committed
+        kwargs = _save_kwargs_without(self, self.update_only_fields, kwargs)
+        super().save(*args, **kwargs)
+        if uploaded:
+            schedule_renditions(process_post_media, self.id)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "created_at"])]
+
 
 class PostInteraction(TrackingModel):
     user = models.ForeignKey(UserAccount, on_delete=models.CASCADE)
@@ -121,6 +204,8 @@ class PostInteraction(TrackingModel):
     like = models.BooleanField(default=False)
     report = models.BooleanField(default=False)
 
+    objects = PostInteractionManager()
+
     class Meta:
         verbose_name = "Post Interaction"
         unique_together = (
@@ -180,4 +265,91 @@ class Notification(TrackingModel):
     objects = NotificationManager()
 
     def __str__(self):
-        return f"{self.id} -> {self.sent_by.first_name}"
\ No newline at end of file
+        return f"{self.id} -> {self.sent_by.first_name}"
+
+    class Meta:
+        # a single notification of every type per sender and post, see NotificationManager
+        constraints = [
+            models.UniqueConstraint(
+                fields=["notification_type", "sent_by", "post"],
+                name="unique_notification_per_interaction",
+            )
+        ]
+
+
+@receiver(pre_delete, sender=Notification)
+def discount_deleted_notification(sender, instance, **kwargs):
+    # also sent for the notifications deleted by the cascade of their post or sender
+    Notification.objects.discount_unread(instance)
+
+
+CONNECTION_EDGE_STATE_CHOICES = (
+    ("sent", "sent"),  # the user has sent a pending request to the peer
+    ("received", "received"),  # the user has received a pending request from the peer
+    ("accepted", "accepted"),  # the user and the peer are connected
+)
+
+
+class ConnectionEdge(models.Model):
+    """
+    Directed adjacency row for the connection graph, two per Connection (one for each user).
+    Kept in sync by the ConnectionManager, so that connection checks and neighbour lists
+    are single index seeks instead of joins over the Connection.users table.
+    """
+
+    connection = models.ForeignKey(
+        Connection, on_delete=models.CASCADE, related_name="edges"
+    )
+
+    user = models.ForeignKey(
+        UserAccount, on_delete=models.CASCADE, related_name="connection_edges"
+    )
+
+    peer = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="+")
+
+    state = models.CharField(
+        max_length=10, choices=CONNECTION_EDGE_STATE_CHOICES, blank=False, null=False
+    )
+
+    class Meta:
+        verbose_name = "Connection Edge"
+        unique_together = (
+            "user",
+            "peer",
+        )
+        indexes = [models.Index(fields=["user", "state", "peer"])]
+
+    def __str__(self):
+        return f"[{self.user_id}] -> [{self.peer_id}] ({self.state})"
+
+
+class TimelineEntry(models.Model):
+    """
+    Materialized feed row, a post by a connected user in the timeline of the owner.
+    Written by main.timelines when the database timeline store is in use.
+    """
+
+    owner = models.ForeignKey(
+        UserAccount, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+
+    # copies of post.user and post.created_at, so that the feed is read from this table alone
+    author = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="+")
+
+    created_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Timeline Entry"
+        unique_together = (
+            "owner",
+            "post",
+        )
+        indexes = [
+            models.Index(fields=["owner", "created_at", "post"]),
+            models.Index(fields=["owner", "author"]),
+        ]
+
+    def __str__(self):
+        return f"[{self.owner_id}] <- [{self.post_id}]"
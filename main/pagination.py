@@ -0,0 +1,127 @@
+import json
+import base64
+import binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+
+class KeysetPagination(object):
+    """
+    Cursor (keyset) pagination over a fixed, unique ordering.
+    The cursor holds the ordering values of the last item on the page, so fetching
+    any page is a range seek on an index covering the ordering, instead of an OFFSET
+    which costs more the deeper the page is.
+
+    The response has the shape:
+        {
+            "next": <cursor for the next page, or null>,
+            "results": [...]
+        }
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor."
+
+    def __init__(self, ordering=("-created_at", "-id"), page_size=None):
+        self.ordering = ordering
+        self.page_size = page_size or settings.DEFAULT_PAGE_SIZE
+        self.next_cursor = None
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, settings.MAX_PAGE_SIZE)
+
+    def encode_cursor(self, values):
+        # full precision isoformat, the cursor has to match the stored values exactly
+        values = [
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in values
+        ]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor, model):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def seek(self, queryset, values):
+        """
+        Filters the queryset to the items strictly after the given ordering values,
+        i.e. (a, b) < (x, y) expanded as (a < x) OR (a = x AND b < y).
+        """
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            lookup = "lt" if field.startswith("-") else "gt"
+            clause = Q(**{f"{field.lstrip('-')}__{lookup}": values[index]})
+            for previous_field, value in zip(self.ordering[:index], values[:index]):
+                clause &= Q(**{previous_field.lstrip("-"): value})
+            condition |= clause
+
+        return queryset.filter(condition)
+
+    def get_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+
+        return self.decode_cursor(cursor, model)
+
+    def get_values(self, item):
+        return [getattr(item, field.lstrip("-")) for field in self.ordering]
+
+    def paginate_queryset(self, queryset, request):
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = self.get_cursor(request, queryset.model)
+        if cursor is not None:
+            queryset = self.seek(queryset, cursor)
+
+        # fetching one extra item tells whether a next page exists, without a COUNT(*)
+        page = list(queryset[: page_size + 1])
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(self.get_values(page[-1]))
+        else:
+            self.next_cursor = None
+
+        return page
+
+    def paginate_keys(self, request, model, fetch_keys):
+        """
+        For pages that aren't a single queryset, e.g. merged from several sources.
+        fetch_keys(cursor, limit) must return up to limit tuples of ordering values,
+        sorted in the paginator's ordering and strictly after the cursor (None for the first page).
+        """
+        page_size = self.get_page_size(request)
+
+        keys = list(fetch_keys(self.get_cursor(request, model), page_size + 1))
+        if len(keys) > page_size:
+            keys = keys[:page_size]
+            self.next_cursor = self.encode_cursor(list(keys[-1]))
+        else:
+            self.next_cursor = None
+
+        return keys
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.next_cursor, "results": data})
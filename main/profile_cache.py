@@ -0,0 +1,164 @@
+"""
+Read-through cache of the serialized user profiles, keyed by UserAccount id.
+
+Every entry holds the User and UserAccount fields served by the profile and
+connection APIs, so they are neither loaded nor serialized again on a hit.
+Entries expire after PROFILE_CACHE_TTL seconds, and are invalidated explicitly
+whenever a UserAccount or its User is saved, wherever from, e.g. the admin.
+The size bound and eviction are those of the configured cache backend,
+e.g. LRU with MAX_ENTRIES for the local-memory cache.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+
+PROFILE_FIELDS = (
+    "username",
+    "email",
+    "first_name",
+    "last_name",
+    "display_picture",
+    "display_picture_renditions",
+    "phone",
+    "date_of_birth",
+    "profile_summary",
+)
+PUBLIC_PROFILE_FIELDS = (
+    "username",
+    "email",
+    "first_name",
+    "last_name",
+    "display_picture",
+    "display_picture_renditions",
+    "profile_summary",
+)
+CONNECTED_USER_FIELDS = (
+    "first_name",
+    "last_name",
+    "display_picture",
+    "display_picture_renditions",
+    "username",
+    "email",
+)
+
+
+def _profile_key(useraccount_id):
+    return f"profile:{useraccount_id}"
+
+
+def _username_key(username):
+    return f"profile:username:{username}"
+
+
+def _serialize(useraccount):
+    # imported here, the serializers depend on the models which invalidate this cache
+    from .serializers import UserAccountSerializer, UserSerializer
+
+    profile = dict(UserSerializer(useraccount.user).data)
+    profile.update(UserAccountSerializer(useraccount).data)
+    return {field: profile[field] for field in PROFILE_FIELDS}
+
+
+def project(profile, fields):
+    return {field: profile[field] for field in fields}
+
+
+def get_profiles(useraccount_ids):
+    """
+    Returns a dict of the profiles of the given UserAccount ids, loading all the misses in one query.
+    Ids of UserAccounts that don't exist are left out.
+    """
+    # imported here, the models invalidate this cache on save
+    from .models import UserAccount
+
+    keys = {_profile_key(useraccount_id): useraccount_id for useraccount_id in useraccount_ids}
+    cached = cache.get_many(keys.keys(), version=settings.PROFILE_CACHE_VERSION)
+    profiles = {keys[key]: profile for key, profile in cached.items()}
+
+    missing = [
+        useraccount_id for useraccount_id in keys.values() if useraccount_id not in profiles
+    ]
+    if missing:
+        loaded = {
+            useraccount.id: _serialize(useraccount)
+            for useraccount in UserAccount.objects.select_related("user").filter(
+                id__in=missing
+            )
+        }
+        cache.set_many(
+            {
+                _profile_key(useraccount_id): profile
+                for useraccount_id, profile in loaded.items()
+            },
+            timeout=settings.PROFILE_CACHE_TTL,
+            version=settings.PROFILE_CACHE_VERSION,
+        )
+        profiles.update(loaded)
+
+    return profiles
+
+
+def get_profile(useraccount_id):
+    return get_profiles([useraccount_id]).get(useraccount_id)
+
+
+def get_useraccount_id(username):
+    from .models import UserAccount
+
+    key = _username_key(username)
+    useraccount_id = cache.get(key, version=settings.PROFILE_CACHE_VERSION)
+    if useraccount_id is None:
+        useraccount_id = (
+            UserAccount.objects.filter(user__username=username)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if useraccount_id is not None:
+            cache.set(
+                key,
+                useraccount_id,
+                timeout=settings.PROFILE_CACHE_TTL,
+                version=settings.PROFILE_CACHE_VERSION,
+            )
+
+    return useraccount_id
+
+
+def invalidate_profile(useraccount_id, username=None):
+    keys = [_profile_key(useraccount_id)]
+    if username is not None:
+        keys.append(_username_key(username))
+
+    cache.delete_many(keys, version=settings.PROFILE_CACHE_VERSION)
+
+
+@receiver(pre_save, sender=User)
+def invalidate_renamed_username(sender, instance, update_fields=None, **kwargs):
+    # the previous username keeps resolving to the account until invalidated
+    if instance.pk is None or (update_fields and "username" not in update_fields):
+        return
+
+    username = (
+        User.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+    )
+    if username is not None and username != instance.username:
+        cache.delete(_username_key(username), version=settings.PROFILE_CACHE_VERSION)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_profile(sender, instance, created, update_fields=None, **kwargs):
+    # the username and email live on the User, e.g. changed through the admin
+    if created or (update_fields and not set(update_fields) & set(PROFILE_FIELDS)):
+        return
+
+    # imported here, the models invalidate this cache on save
+    from .models import UserAccount
+
+    useraccount_id = (
+        UserAccount.objects.filter(user=instance).values_list("id", flat=True).first()
+    )
+    if useraccount_id is not None:
+        invalidate_profile(useraccount_id)
@@ -0,0 +1,99 @@
+"""
+Pushes events to the websocket consumers in chat.consumers, through the channel layer.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def notification_group_name(useraccount_id):
+    return f"notifications_{useraccount_id}"
+
+
+def connection_group_name(useraccount_id, other_useraccount_id):
+    return "connection_{}_{}".format(
+        *sorted([useraccount_id, other_useraccount_id])
+    )
+
+
+def publish_connection_removed(useraccount_id, other_useraccount_id):
+    """
+    Tells the consumers serving the two users that they aren't connected anymore,
+    so that they drop their cached state. Meant to be run once the deletion commits.
+    """
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            connection_group_name(useraccount_id, other_useraccount_id),
+            {"type": "connection_removed"},
+        )
+    except Exception:
+        logger.exception(
+            "Failed to publish the removal of connection %s - %s.",
+            useraccount_id,
+            other_useraccount_id,
+        )
+
+
+def publish_notification(notification, receiver_ids):
+    """
+    Sends the notification to the notification group of every receiver.
+    Meant to be run once the transaction creating the notification commits.
+    """
+    # imported here, the representations depend on the models and so on the managers calling this
+    from .representations import NOTIFICATION
+
+    event = {
+        "type": "send_notification",
+        "notification": NOTIFICATION.from_instance(notification),
+    }
+
+    channel_layer = get_channel_layer()
+    receiver_ids = list(receiver_ids)
+    chunk_size = settings.NOTIFICATION_PUBLISH_CONCURRENCY
+
+    async def send_all():
+        # the sends of a chunk wait on the channel layer concurrently
+        failed = 0
+        for index in range(0, len(receiver_ids), chunk_size):
+            results = await asyncio.gather(
+                *[
+                    channel_layer.group_send(notification_group_name(receiver_id), event)
+                    for receiver_id in receiver_ids[index : index + chunk_size]
+                ],
+                return_exceptions=True,
+            )
+            failed += sum(isinstance(result, Exception) for result in results)
+        return failed
+
+    try:
+        failed = async_to_sync(send_all)()
+    except Exception:
+        failed = len(receiver_ids)
+    if failed:
+        # clients still get the notification from NotificationListAPI
+        logger.error(
+            "Failed to publish notification %s to %s receivers.", notification.id, failed
+        )
+
+
+def publish_read_receipt(conversation_group_name, username, message_id):
+    """
+    Tells the ConversationConsumers of a conversation that the user has read it up to message_id.
+    """
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            conversation_group_name,
+            {"type": "read_receipt", "reader": username, "message_id": message_id},
+        )
+    except Exception:
+        logger.exception(
+            "Failed to publish the read receipt of %s in %s.",
+            username,
+            conversation_group_name,
+        )
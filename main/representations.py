@@ -0,0 +1,148 @@
+"""
+Precompiled, read-only representations for the large lists of the hot endpoints.
+
+The DRF serializers look up, bind and run every field of every object they serialize,
+which dominates the CPU time of the feed, notification and message lists. A Representation
+resolves its fields once, when declared, and builds the same dicts as the matching
+serializer straight from the .values_list(*representation.lookups) rows of a queryset,
+or from instances with their related objects already loaded.
+
+The serializers stay in use for writes and single objects.
+"""
+from operator import attrgetter, itemgetter
+
+from rest_framework.fields import DateTimeField
+
+from . import media
+from .metrics import timed_serialization
+from .models import Post, UserAccount
+
+
+def _getter(indexes, to_representation):
+    if to_representation is None:
+        return itemgetter(indexes[0])
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda values: to_representation(values[index])
+    return lambda values: to_representation(*[values[index] for index in indexes])
+
+
+class Representation(object):
+    """
+    Declared as (key, lookups, to_representation) fields, in the order of the output.
+    lookups is a field lookup, e.g. "post__text", or a tuple of them, whose values
+    to_representation gets. Without to_representation, the value is output as it is.
+    """
+
+    def __init__(self, *fields):
+        lookups = []
+        self.fields = []
+        for key, field_lookups, to_representation in fields:
+            if isinstance(field_lookups, str):
+                field_lookups = (field_lookups,)
+
+            indexes = []
+            for lookup in field_lookups:
+                if lookup not in lookups:
+                    lookups.append(lookup)
+                indexes.append(lookups.index(lookup))
+            self.fields.append((key, _getter(indexes, to_representation)))
+
+        self.lookups = tuple(lookups)
+        # the same values read from instances, related objects through their attributes,
+        # always as a tuple, which attrgetter only returns for several attributes
+        attributes = attrgetter(*[lookup.replace("__", ".") for lookup in self.lookups])
+        if len(self.lookups) == 1:
+            self._attributes = lambda instance: (attributes(instance),)
+        else:
+            self._attributes = attributes
+
+    def build(self, values):
+        """
+        The representation of a single row, its values in the order of self.lookups.
+        """
+        return {key: getter(values) for key, getter in self.fields}
+
+    def from_rows(self, rows):
+        with timed_serialization():
+            return [self.build(values) for values in rows]
+
+    def from_instances(self, instances):
+        with timed_serialization():
+            return [self.build(self._attributes(instance)) for instance in instances]
+
+    def from_instance(self, instance):
+        return self.from_instances([instance])[0]
+
+
+def nested(key, prefix, representation):
+    """
+    Field nesting the representation of the related object at prefix.
+    """
+    return (
+        key,
+        tuple(f"{prefix}__{lookup}" for lookup in representation.lookups),
+        lambda *values: representation.build(values),
+    )
+
+
+def flattened(prefix, fields):
+    """
+    Fields of the related object at prefix, flattened into the representation as FlattenMixin does.
+    """
+    return [
+        (key, f"{prefix}__{lookup}", to_representation)
+        for key, lookup, to_representation in fields
+    ]
+
+
+def file_url(model, field_name):
+    """
+    to_representation of a file field, its URL as DRF gives it without a request.
+    """
+    storage = model._meta.get_field(field_name).storage
+
+    def to_representation(value):
+        name = getattr(value, "name", value)
+        return storage.url(name) if name else None
+
+    return to_representation
+
+
+datetime = DateTimeField().to_representation
+
+
+# main.serializers.PostSerializer
+POST = Representation(
+    ("id", "id", None),
+    ("text", "text", None),
+    ("media", "media", file_url(Post, "media")),
+    ("media_renditions", ("media", "media_renditions"), media.urls),
+    ("likes", "likes", None),
+    ("created_at", "created_at", datetime),
+)
+
+# main.serializers.NotificationSerializer
+NOTIFICATION = Representation(
+    ("id", "id", None),
+    nested("post", "post", POST),
+    ("notification_type", "notification_type", None),
+    ("url", "url", None),
+    ("text", "text", None),
+    ("created_at", "created_at", datetime),
+)
+
+# main.serializers.ConnectedUserSerializer
+CONNECTED_USER_FIELDS = (
+    ("first_name", "first_name", None),
+    ("last_name", "last_name", None),
+    ("display_picture", "display_picture", file_url(UserAccount, "display_picture")),
+    ("username", "user__username", None),
+    ("email", "user__email", None),
+)
+
+# main.serializers.ConnectionSerializer
+CONNECTION = Representation(
+    ("created_at", "created_at", datetime),
+    *flattened("sent_by", CONNECTED_USER_FIELDS),
+)
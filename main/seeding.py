@@ -0,0 +1,431 @@
+"""
+Bulk generation of synthetic data, for profiling and load testing, see the seed_data command.
+
+Rows are generated user by user and written through chunked bulk inserts, with explicit
+primary keys so that nothing has to be read back and only a batch is held in memory.
+The connection graph is streamed as well: every pair of users (u, v) with u < v is only
+ever considered from u, so no edge is generated twice and none has to be remembered.
+The same arguments and seed always generate the same rows.
+
+Graph models:
+    uniform     every pair is connected with the same probability (Erdos-Renyi)
+    power-law   users have Zipf distributed expected degrees (Chung-Lu), a few have
+                very many connections and most have few
+    clustered   users form communities of cluster_size, most connections are within
+                the community and cross_fraction of them lead outside (stochastic block model)
+"""
+import math
+import random
+from array import array
+from collections import defaultdict
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db.models import Max
+
+from . import timelines
+from .models import (
+    Connection,
+    ConnectionEdge,
+    Notification,
+    Post,
+    PostInteraction,
+    UserAccount,
+)
+
+
+GRAPH_MODELS = ("uniform", "power-law", "clustered")
+
+FIRST_NAMES = (
+    "Aarav", "Aditi", "Arjun", "Diya", "Ishaan", "Kavya", "Meera", "Neha",
+    "Nikhil", "Priya", "Rahul", "Riya", "Rohan", "Saanvi", "Tara", "Vivaan",
+)
+LAST_NAMES = (
+    "Bose", "Das", "Gupta", "Iyer", "Jain", "Kapoor", "Mehta", "Nair",
+    "Patel", "Rao", "Reddy", "Shah", "Sharma", "Singh", "Verma", "Yadav",
+)
+
+
+def _skip(rng, p):
+    # number of candidates skipped before the next success, each one succeeding with probability p
+    if p >= 1:
+        return 0
+    return int(math.log(1.0 - rng.random()) / math.log(1.0 - p))
+
+
+def _bernoulli_range(rng, start, stop, p):
+    # the successes among start..stop-1, in O(successes) instead of O(stop - start)
+    if p <= 0:
+        return
+    v = start + _skip(rng, p)
+    while v < stop:
+        yield v
+        v += 1 + _skip(rng, p)
+
+
+def uniform_edges(rng, users, degree):
+    p = degree / max(users - 1, 1)
+    for u in range(users):
+        for v in _bernoulli_range(rng, u + 1, users, p):
+            yield u, v
+
+
+def power_law_edges(rng, users, degree, exponent=2.5):
+    """
+    Chung-Lu graph, pair (u, v) connected with probability w[u] * w[v] / sum(w), with the
+    expected degrees w decreasing along the user index. Sampled by skipping (Miller-Hagberg).
+    """
+    weights = array("d", ((index + 1) ** (-1 / (exponent - 1)) for index in range(users)))
+    scale = degree * users / sum(weights)
+    weights = array("d", (weight * scale for weight in weights))
+    total = sum(weights)
+
+    for u in range(users - 1):
+        v = u + 1
+        p = min(weights[u] * weights[v] / total, 1)
+        while v < users and p > 0:
+            if p != 1:
+                v += _skip(rng, p)
+            if v < users:
+                # the weights decrease with v, so p bounds the probability of every skipped pair
+                q = min(weights[u] * weights[v] / total, 1)
+                if rng.random() < q / p:
+                    yield u, v
+                p = q
+                v += 1
+
+
+def clustered_edges(rng, users, degree, cluster_size=50, cross_fraction=0.1):
+    cluster_size = max(2, min(cluster_size, users))
+    p_in = min(degree * (1 - cross_fraction) / (cluster_size - 1), 1)
+    p_out = min(degree * cross_fraction / max(users - cluster_size, 1), 1)
+
+    for u in range(users):
+        cluster_end = min((u // cluster_size + 1) * cluster_size, users)
+        for v in _bernoulli_range(rng, u + 1, cluster_end, p_in):
+            yield u, v
+        for v in _bernoulli_range(rng, cluster_end, users, p_out):
+            yield u, v
+
+
+class BulkWriter(object):
+    """
+    Buffers new rows per model and writes them with bulk_create once batch_size are buffered.
+    Models are flushed in the order their first row was added, so parents are written before
+    the rows referencing them as long as they are added first.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = defaultdict(int)
+
+    def add(self, instance):
+        buffer = self.buffers.setdefault(type(instance), [])
+        buffer.append(instance)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for model, buffer in self.buffers.items():
+            if buffer:
+                model.objects.bulk_create(buffer, batch_size=self.batch_size)
+                self.counts[model._meta.label] += len(buffer)
+                buffer.clear()
+
+
+def _next_id(model):
+    return (model.objects.aggregate(max_id=Max("pk"))["max_id"] or 0) + 1
+
+
+class Seeder(object):
+    def __init__(
+        self,
+        users=1000,
+        degree=20,
+        graph="power-law",
+        cluster_size=50,
+        cross_fraction=0.1,
+        posts_per_user=5,
+        interactions_per_user=10,
+        report_fraction=0.02,
+        conversations_per_user=2,
+        messages_per_conversation=20,
+        seed=0,
+        prefix="seed",
+        batch_size=1000,
+        log=None,
+    ):
+        if graph not in GRAPH_MODELS:
+            raise ValueError(f"Unknown graph model {graph}.")
+
+        self.users = users
+        self.degree = degree
+        self.graph = graph
+        self.cluster_size = cluster_size
+        self.cross_fraction = cross_fraction
+        self.posts_per_user = posts_per_user
+        self.interactions_per_user = interactions_per_user
+        self.report_fraction = report_fraction
+        self.conversations_per_user = conversations_per_user
+        self.messages_per_conversation = messages_per_conversation
+        self.seed = seed
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+
+        self.writer = BulkWriter(batch_size)
+
+    def rng(self, stage):
+        # a generator per stage, so that changing one stage doesn't change the others
+        return random.Random(f"{self.seed}:{stage}")
+
+    def run(self, rebuild_timelines=True):
+        self.user_base = _next_id(User)
+        self.useraccount_base = _next_id(UserAccount)
+        self.post_base = _next_id(Post)
+
+        self.seed_users()
+        self.seed_connections()
+        self.seed_posts()
+        self.seed_interactions()
+        self.seed_conversations()
+        self.update_counters()
+        if rebuild_timelines:
+            self.rebuild_timelines()
+
+        return dict(self.writer.counts)
+
+    def useraccount_ids(self):
+        return range(self.useraccount_base, self.useraccount_base + self.users)
+
+    def post_id(self, useraccount_id, index):
+        # the posts of every user are a contiguous range of ids
+        return (
+            self.post_base
+            + (useraccount_id - self.useraccount_base) * self.posts_per_user
+            + index
+        )
+
+    def peers(self, first, last):
+        """
+        Maps the ids of the users from first to last to the sorted ids of their connections,
+        read back from the adjacency rows so that the graph is never held in memory.
+        """
+        peers = defaultdict(list)
+        for user_id, peer_id in (
+            ConnectionEdge.objects.filter(
+                user_id__gte=first, user_id__lte=last, state="accepted"
+            )
+            .order_by("user_id", "peer_id")
+            .values_list("user_id", "peer_id")
+            .iterator()
+        ):
+            peers[user_id].append(peer_id)
+        return peers
+
+    def chunks(self):
+        ids = self.useraccount_ids()
+        for index in range(0, len(ids), self.batch_size):
+            chunk = ids[index : index + self.batch_size]
+            yield chunk, self.peers(chunk[0], chunk[-1])
+
+    def seed_users(self):
+        rng = self.rng("users")
+        # hashing is slow on purpose, every user gets the same password
+        password = make_password(self.prefix)
+
+        for index in range(self.users):
+            username = f"{self.prefix}{index}"
+            self.writer.add(
+                User(
+                    id=self.user_base + index,
+                    username=username,
+                    email=f"{username}@example.com",
+                    password=password,
+                )
+            )
+            self.writer.add(
+                UserAccount(
+                    id=self.useraccount_base + index,
+                    user_id=self.user_base + index,
+                    first_name=rng.choice(FIRST_NAMES),
+                    last_name=rng.choice(LAST_NAMES),
+                    phone=f"9{rng.randrange(10 ** 9):09d}",
+                    date_of_birth=date(
+                        rng.randint(1960, 2002), rng.randint(1, 12), rng.randint(1, 28)
+                    ),
+                )
+            )
+        self.writer.flush()
+        self.log(f"{self.users} users")
+
+    def edges(self):
+        rng = self.rng("connections")
+        if self.graph == "uniform":
+            return uniform_edges(rng, self.users, self.degree)
+        if self.graph == "clustered":
+            return clustered_edges(
+                rng, self.users, self.degree, self.cluster_size, self.cross_fraction
+            )
+        return power_law_edges(rng, self.users, self.degree)
+
+    def seed_connections(self):
+        self.connections_counts = array("L", [0]) * self.users
+
+        connection_id = _next_id(Connection)
+        through = Connection.users.through
+        for u, v in self.edges():
+            user, peer = self.useraccount_base + u, self.useraccount_base + v
+            self.writer.add(Connection(id=connection_id, sent_by_id=user, accepted=True))
+            for a, b in ((user, peer), (peer, user)):
+                self.writer.add(through(connection_id=connection_id, useraccount_id=a))
+                self.writer.add(
+                    ConnectionEdge(
+                        connection_id=connection_id, user_id=a, peer_id=b, state="accepted"
+                    )
+                )
+            self.connections_counts[u] += 1
+            self.connections_counts[v] += 1
+            connection_id += 1
+        self.writer.flush()
+        self.log(f"{self.writer.counts['main.Connection']} connections")
+
+    def seed_posts(self):
+        rng = self.rng("posts")
+        for useraccount_id in self.useraccount_ids():
+            for index in range(self.posts_per_user):
+                self.writer.add(
+                    Post(
+                        id=self.post_id(useraccount_id, index),
+                        user_id=useraccount_id,
+                        text=f"Post {index} of {useraccount_id}, #{rng.randrange(1000)}",
+                    )
+                )
+        self.writer.flush()
+        self.log(f"{self.users * self.posts_per_user} posts")
+
+    def seed_interactions(self):
+        """
+        Likes and reports of the posts of connected users, each with its notification to the author.
+        """
+        self.unread_counts = array("L", [0]) * self.users
+        if not self.posts_per_user:
+            return
+
+        rng = self.rng("interactions")
+        notification_id = _next_id(Notification)
+        through = Notification.sent_to.through
+        for chunk, peers in self.chunks():
+            for useraccount_id in chunk:
+                if not peers[useraccount_id]:
+                    continue
+
+                posts = set()
+                for _ in range(self.interactions_per_user):
+                    author_id = rng.choice(peers[useraccount_id])
+                    posts.add(
+                        (author_id, self.post_id(author_id, rng.randrange(self.posts_per_user)))
+                    )
+
+                for author_id, post_id in sorted(posts):
+                    report = rng.random() < self.report_fraction
+                    self.writer.add(
+                        PostInteraction(
+                            user_id=useraccount_id, post_id=post_id, like=not report, report=report
+                        )
+                    )
+                    self.writer.add(
+                        Notification(
+                            id=notification_id,
+                            sent_by_id=useraccount_id,
+                            post_id=post_id,
+                            notification_type="report" if report else "like",
+                            text=f"Your post was {'reported' if report else 'liked'}.",
+                        )
+                    )
+                    self.writer.add(
+                        through(notification_id=notification_id, useraccount_id=author_id)
+                    )
+                    self.unread_counts[author_id - self.useraccount_base] += 1
+                    notification_id += 1
+        self.writer.flush()
+        self.log(f"{self.writer.counts['main.PostInteraction']} post interactions")
+
+    def seed_conversations(self):
+        # imported here, chat depends on main and not the other way round
+        from chat.managers import get_pair_key
+        from chat.models import Conversation, ConversationReadState, Message
+
+        rng = self.rng("conversations")
+        message_id = _next_id(Message)
+        through = Conversation.users.through
+        for chunk, peers in self.chunks():
+            for useraccount_id in chunk:
+                # started from the lower id of the pair only, so that no pair is repeated
+                candidates = [peer for peer in peers[useraccount_id] if peer > useraccount_id]
+                for peer in rng.sample(
+                    candidates, min(self.conversations_per_user, len(candidates))
+                ):
+                    pair_key = get_pair_key(
+                        UserAccount(id=useraccount_id), UserAccount(id=peer)
+                    )
+                    self.writer.add(Conversation(name=pair_key, pair_key=pair_key))
+                    for participant in (useraccount_id, peer):
+                        self.writer.add(
+                            through(conversation_id=pair_key, useraccount_id=participant)
+                        )
+                        self.writer.add(
+                            ConversationReadState(
+                                conversation_id=pair_key, user_id=participant
+                            )
+                        )
+                    for index in range(self.messages_per_conversation):
+                        self.writer.add(
+                            Message(
+                                id=message_id,
+                                conversation_id=pair_key,
+                                sender_id=rng.choice((useraccount_id, peer)),
+                                text=f"Message {index}",
+                            )
+                        )
+                        message_id += 1
+        self.writer.flush()
+        self.log(f"{self.writer.counts['chat.Conversation']} conversations")
+
+    def _update_user_counter(self, field, counts):
+        # one UPDATE per distinct value and batch of users, instead of one per user
+        by_value = defaultdict(list)
+        for index, value in enumerate(counts):
+            if value:
+                by_value[value].append(self.useraccount_base + index)
+
+        for value, useraccount_ids in by_value.items():
+            for index in range(0, len(useraccount_ids), self.batch_size):
+                UserAccount.objects.filter(
+                    id__in=useraccount_ids[index : index + self.batch_size]
+                ).update(**{field: value})
+
+    def update_counters(self):
+        self._update_user_counter("connections_count", self.connections_counts)
+        self._update_user_counter("unread_notifications_count", self.unread_counts)
+
+        last_post_id = self.post_id(self.useraccount_base + self.users, 0)
+        for first in range(self.post_base, last_post_id, self.batch_size):
+            Post.objects.filter(
+                id__gte=first, id__lt=min(first + self.batch_size, last_post_id)
+            ).update(
+                likes=Post.objects.interaction_count(like=True),
+                reports=Post.objects.interaction_count(report=True),
+            )
+        self.log("counters updated")
+
+    def rebuild_timelines(self):
+        ids = self.useraccount_ids()
+        for useraccount in UserAccount.objects.filter(
+            id__gte=ids[0], id__lte=ids[-1]
+        ).iterator():
+            timelines.rebuild(useraccount, settings.FEED_TIMELINE_LENGTH)
+        self.log("timelines rebuilt")
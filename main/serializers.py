@@ -2,6 +2,8 @@ from django.db import transaction
 from rest_framework import serializers
 from django.contrib.auth.models import User
 
+from . import media
+from .metrics import SerializerTimingMixin
 from .models import Connection, Notification, Post, UserAccount
 
 from datetime import date
@@ -37,34 +39,42 @@ class FlattenMixin(object):
 
 
 # UserAccount Serializer
-class UserAccountSerializer(serializers.ModelSerializer):
+class UserAccountSerializer(SerializerTimingMixin, serializers.ModelSerializer):
+    display_picture_renditions = serializers.SerializerMethodField()
+
+    def get_display_picture_renditions(self, useraccount):
+        return media.urls(
+            useraccount.display_picture, useraccount.display_picture_renditions
+        )
+
     class Meta:
         model = UserAccount
         fields = (
             "first_name",
             "last_name",
             "display_picture",
+            "display_picture_renditions",
             "phone",
             "date_of_birth",
             "profile_summary",
         )
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     class Meta:
         model = UserAccount
         fields = ("first_name", "last_name", "display_picture", "profile_summary")
 
 
 # User Serializer
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ("username", "email")
 
 
 # Register Serializer
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     user_account = UserAccountSerializer(required=True)
 
     class Meta:
@@ -109,14 +119,20 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 
 # Post Serializer
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SerializerTimingMixin, serializers.ModelSerializer):
+    media_renditions = serializers.SerializerMethodField()
+
+    def get_media_renditions(self, post):
+        return media.urls(post.media, post.media_renditions)
+
     class Meta:
         model = Post
-        fields = ("id", "text", "media", "likes", "created_at")
+        fields = ("id", "text", "media", "media_renditions", "likes", "created_at")
+        read_only_fields = ("likes",)
 
 
 # Notification Serializer
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     post = PostSerializer()
 
     class Meta:
@@ -125,7 +141,9 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 
 # Connection Serializer
-class ConnectedUserSerializer(FlattenMixin, serializers.ModelSerializer):
+class ConnectedUserSerializer(
+    SerializerTimingMixin, FlattenMixin, serializers.ModelSerializer
+):
     class Meta:
         model = UserAccount
         fields = (
@@ -137,7 +155,9 @@ class ConnectedUserSerializer(FlattenMixin, serializers.ModelSerializer):
         flatten = [("user", UserSerializer)]
 
 
-class ConnectionSerializer(FlattenMixin, serializers.ModelSerializer):
+class ConnectionSerializer(
+    SerializerTimingMixin, FlattenMixin, serializers.ModelSerializer
+):
     class Meta:
         model = Connection
         fields = ("created_at",)
@@ -0,0 +1,370 @@
+"""
+Materialized per-user feed timelines.
+
+Posts are fanned out on write into the timeline of every connection of the author,
+so that reading the feed is a range scan over one timeline instead of a scan over the
+posts of every connected user. Authors with more than FEED_FANOUT_MAX_DEGREE connections
+are skipped on write, and their posts are pulled on read instead, so a single post never
+triggers more than FEED_FANOUT_MAX_DEGREE timeline writes. When an author drops back
+under the threshold, their recent posts are backfilled into the timelines of their
+connections, as those made while above it were never fanned out. The feed of the
+accounts that predate the timelines is pulled from the posts until theirs is rebuilt,
+e.g. with the rebuild_timelines command.
+
+The timelines live either in the database (TimelineEntry) or in redis sorted sets,
+as selected by the FEED_TIMELINE_BACKEND setting.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Connection, Post, TimelineEntry, UserAccount
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _to_score(created_at):
+    # integer microseconds, exact within the range of a redis score
+    return (created_at - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def _from_score(score):
+    return EPOCH + datetime.timedelta(microseconds=int(score))
+
+
+def _before(queryset, before, created_at_field="created_at", id_field="id"):
+    if before is None:
+        return queryset
+
+    created_at, id = before
+    return queryset.filter(
+        Q(**{f"{created_at_field}__lt": created_at})
+        | Q(**{created_at_field: created_at, f"{id_field}__lt": id})
+    )
+
+
+class DatabaseTimelineStore(object):
+    """
+    Timelines stored as TimelineEntry rows, read through the (owner, created_at, post) index.
+    Every timeline is trimmed to its most recent FEED_TIMELINE_LENGTH entries, as in redis.
+    Entries are removed along with their posts by the database cascade.
+    """
+
+    batch_size = 1000
+
+    def __init__(self, length):
+        self.length = length
+
+    def _entries(self, owner_id):
+        return TimelineEntry.objects.filter(owner_id=owner_id).order_by(
+            "-created_at", "-post_id"
+        )
+
+    def add(self, owner_ids, entries):
+        """
+        entries are (created_at, post_id, author_id) tuples, added to every owner's timeline.
+        """
+        owner_ids = list(owner_ids)
+        entries = list(entries)
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    owner_id=owner_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    created_at=created_at,
+                )
+                for owner_id in owner_ids
+                for created_at, post_id, author_id in entries
+            ],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        if entries:
+            self.trim(owner_ids)
+
+    def trim(self, owner_ids):
+        for owner_id in owner_ids:
+            # the newest entry past the length, a seek on the index
+            boundary = list(
+                self._entries(owner_id).values_list("created_at", "post_id")[
+                    self.length : self.length + 1
+                ]
+            )
+            if boundary:
+                created_at, post_id = boundary[0]
+                TimelineEntry.objects.filter(
+                    Q(created_at__lt=created_at)
+                    | Q(created_at=created_at, post_id__lte=post_id),
+                    owner_id=owner_id,
+                ).delete()
+
+    def remove_posts(self, owner_ids, post_ids):
+        TimelineEntry.objects.filter(post_id__in=post_ids).delete()
+
+    def remove_author(self, owner_id, author_id):
+        TimelineEntry.objects.filter(owner_id=owner_id, author_id=author_id).delete()
+
+    def clear(self, owner_id):
+        TimelineEntry.objects.filter(owner_id=owner_id).delete()
+
+    def page(self, owner_id, before, limit):
+        entries = _before(self._entries(owner_id), before, id_field="post_id")
+        return list(entries.values_list("created_at", "post_id")[:limit])
+
+    def is_truncated(self, owner_id):
+        last = self._entries(owner_id).values_list("id")[self.length - 1 : self.length]
+        return bool(list(last))
+
+
+class RedisTimelineStore(object):
+    """
+    Timelines stored as redis sorted sets of post ids, scored by the creation time of the post.
+    Every timeline is trimmed to its most recent FEED_TIMELINE_LENGTH entries,
+    older pages are pulled from the database instead.
+    """
+
+    batch_size = 1000
+
+    def __init__(self, url, length):
+        # only a dependency when this backend is selected
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.length = length
+
+    def key(self, owner_id):
+        return f"timeline:{owner_id}"
+
+    def add(self, owner_ids, entries):
+        mapping = {post_id: _to_score(created_at) for created_at, post_id, _ in entries}
+        if not mapping:
+            return
+
+        owner_ids = list(owner_ids)
+        for index in range(0, len(owner_ids), self.batch_size):
+            pipeline = self.client.pipeline(transaction=False)
+            for owner_id in owner_ids[index : index + self.batch_size]:
+                pipeline.zadd(self.key(owner_id), mapping)
+                pipeline.zremrangebyrank(self.key(owner_id), 0, -(self.length + 1))
+            pipeline.execute()
+
+    def remove_posts(self, owner_ids, post_ids):
+        post_ids = list(post_ids)
+        owner_ids = list(owner_ids)
+        for index in range(0, len(owner_ids), self.batch_size):
+            pipeline = self.client.pipeline(transaction=False)
+            for owner_id in owner_ids[index : index + self.batch_size]:
+                pipeline.zrem(self.key(owner_id), *post_ids)
+            pipeline.execute()
+
+    def remove_author(self, owner_id, author_id):
+        post_ids = list(
+            Post.objects.filter(user_id=author_id).values_list("id", flat=True)
+        )
+        for index in range(0, len(post_ids), self.batch_size):
+            self.client.zrem(
+                self.key(owner_id), *post_ids[index : index + self.batch_size]
+            )
+
+    def clear(self, owner_id):
+        self.client.delete(self.key(owner_id))
+
+    def page(self, owner_id, before, limit):
+        key = self.key(owner_id)
+        max_score = "+inf" if before is None else _to_score(before[0])
+        before = None if before is None else (before[0], before[1])
+
+        keys = set()
+
+        def collect(rows):
+            for member, score in rows:
+                item = (_from_score(score), int(member))
+                if before is None or item < before:
+                    keys.add(item)
+
+        offset = 0
+        while len(keys) < limit:
+            rows = self.client.zrevrangebyscore(
+                key, max_score, "-inf", start=offset, num=limit, withscores=True
+            )
+            if not rows:
+                break
+            offset += len(rows)
+            collect(rows)
+
+        page = sorted(keys, reverse=True)[:limit]
+        if len(page) == limit:
+            # members sharing a score come back in string order, so make sure
+            # none of the ones tied with the last item of the page were missed
+            boundary = _to_score(page[-1][0])
+            collect(self.client.zrangebyscore(key, boundary, boundary, withscores=True))
+            page = sorted(keys, reverse=True)[:limit]
+
+        return page
+
+    def is_truncated(self, owner_id):
+        return self.client.zcard(self.key(owner_id)) >= self.length
+
+
+_store = None
+
+
+def get_timeline_store():
+    global _store
+
+    if _store is None:
+        if settings.FEED_TIMELINE_BACKEND == "redis":
+            _store = RedisTimelineStore(
+                settings.FEED_TIMELINE_REDIS_URL, settings.FEED_TIMELINE_LENGTH
+            )
+        else:
+            _store = DatabaseTimelineStore(settings.FEED_TIMELINE_LENGTH)
+
+    return _store
+
+
+def is_high_degree(connections_count):
+    return connections_count > settings.FEED_FANOUT_MAX_DEGREE
+
+
+def _connections_count(useraccount_id):
+    # read again, the instances at hand may be older than the last connection change
+    return (
+        UserAccount.objects.filter(id=useraccount_id)
+        .values_list("connections_count", flat=True)
+        .get()
+    )
+
+
+def _recent_posts(author_id, limit):
+    return list(
+        Post.objects.filter(user_id=author_id)
+        .order_by("-created_at", "-id")
+        .values_list("created_at", "id", "user_id")[:limit]
+    )
+
+
+def fan_out(post):
+    """
+    Pushes a new post into the timelines of the author's connections.
+    To be run once the post is committed.
+    """
+    if is_high_degree(_connections_count(post.user_id)):
+        return
+
+    get_timeline_store().add(
+        Connection.objects.connected_user_ids(post.user),
+        [(post.created_at, post.id, post.user_id)],
+    )
+
+
+def remove_post(post):
+    get_timeline_store().remove_posts(
+        Connection.objects.connected_user_ids(post.user), [post.id]
+    )
+
+
+def connect(user, peer, connections_counts):
+    """
+    Backfills the recent posts of two newly connected users into each other's timeline.
+    connections_counts maps the id of each of them to their count after connecting.
+
+    An author crossing above the threshold keeps their posts in the timelines they were
+    already fanned out to, the feed pulling the same posts on read is deduplicated.
+    """
+    store = get_timeline_store()
+    for owner, author in ((user, peer), (peer, user)):
+        if not is_high_degree(connections_counts[author.id]):
+            store.add(
+                [owner.id],
+                _recent_posts(author.id, settings.FEED_TIMELINE_BACKFILL),
+            )
+
+
+def disconnect(user, peer, connections_counts):
+    """
+    Removes the posts of two disconnected users from each other's timeline.
+    connections_counts maps the id of each of them to their count after disconnecting,
+    an author who just dropped back under the threshold has their recent posts backfilled
+    into the timelines of their remaining connections.
+    """
+    store = get_timeline_store()
+    store.remove_author(user.id, peer.id)
+    store.remove_author(peer.id, user.id)
+
+    for author in (user, peer):
+        if connections_counts[author.id] == settings.FEED_FANOUT_MAX_DEGREE:
+            store.add(
+                Connection.objects.connected_user_ids(author),
+                _recent_posts(author.id, settings.FEED_TIMELINE_BACKFILL),
+            )
+
+
+def rebuild(useraccount, limit):
+    """
+    Rebuilds the timeline of a user from scratch, with up to limit of the most recent posts.
+    """
+    store = get_timeline_store()
+    store.clear(useraccount.id)
+
+    authors = UserAccount.objects.filter(
+        id__in=Connection.objects.connected_user_ids(useraccount),
+        connections_count__lte=settings.FEED_FANOUT_MAX_DEGREE,
+    ).values("id")
+    store.add(
+        [useraccount.id],
+        Post.objects.filter(user__in=authors)
+        .order_by("-created_at", "-id")
+        .values_list("created_at", "id", "user_id")[:limit],
+    )
+    UserAccount.objects.filter(id=useraccount.id, timeline_built=False).update(
+        timeline_built=True
+    )
+
+
+def _pull(posts, before, limit):
+    return list(
+        _before(posts, before)
+        .order_by("-created_at", "-id")
+        .values_list("created_at", "id")[:limit]
+    )
+
+
+def feed_page(useraccount, before, limit):
+    """
+    Returns up to limit (created_at, post_id) keys of the feed of the user, newest first
+    and strictly older than before, merging the materialized timeline with the posts
+    pulled on read from high-degree connections.
+    """
+    store = get_timeline_store()
+    connected_user_ids = Connection.objects.connected_user_ids(useraccount)
+
+    if not useraccount.timeline_built:
+        # the timeline would miss the posts from before it existed, until rebuilt
+        return _pull(Post.objects.filter(user__in=connected_user_ids), before, limit)
+
+    keys = store.page(useraccount.id, before, limit)
+    # a first page shorter than the limit is the whole timeline, which can't be trimmed
+    first_page_complete = before is None and limit <= settings.FEED_TIMELINE_LENGTH
+    if (
+        len(keys) < limit
+        and not first_page_complete
+        and store.is_truncated(useraccount.id)
+    ):
+        # the older entries were trimmed off the timeline
+        keys += _pull(
+            Post.objects.filter(user__in=connected_user_ids),
+            keys[-1] if keys else before,
+            limit - len(keys),
+        )
+
+    high_degree_users = UserAccount.objects.filter(
+        id__in=connected_user_ids,
+        connections_count__gt=settings.FEED_FANOUT_MAX_DEGREE,
+    ).values("id")
+    keys += _pull(Post.objects.filter(user__in=high_degree_users), before, limit)
+
+    return sorted(set(keys), reverse=True)[:limit]
@@ -9,7 +9,9 @@ from .views import (
     ConnectionsAPI,
     ConnectionsListAPI,
     FeedAPI,
+    MetricsAPI,
     NotificationListAPI,
+    NotificationUnreadAPI,
     PostInteractionAPI,
     PostListAPI,
     PostAPI,
@@ -51,6 +53,11 @@ urlpatterns = [
         NotificationListAPI.as_view(),
         name="notification_list",
     ),
+    path(
+        "api/content/notification/unread/",
+        NotificationUnreadAPI.as_view(),
+        name="notification_unread",
+    ),
     # connections
     path(
         "api/connections/connections/",
@@ -77,4 +84,6 @@ urlpatterns = [
         ConnectionRequestResponseAPI.as_view(),
         name="connection_request_response",
     ),
+    # metrics
+    path("api/metrics/", MetricsAPI.as_view(), name="metrics"),
 ]
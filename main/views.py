@@ -1,19 +1,19 @@
+from django.conf import settings
 from django.core.files.base import ContentFile
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.db import connection
-from django.db.transaction import atomic
+from django.db.transaction import on_commit
 from rest_framework import response
 from rest_framework.views import APIView
 from django.contrib.auth.models import User
 from rest_framework.response import Response
 from rest_framework import generics, status
 from main.models import Notification, Post, PostInteraction, UserAccount, Connection
+from . import metrics, profile_cache, representations, timelines
+from .pagination import KeysetPagination
 from .serializers import (
-    ConnectedUserSerializer,
-    ConnectionSerializer,
     NotificationSerializer,
     UserAccountSerializer,
-    UserProfileSerializer,
     UserSerializer,
     PostSerializer,
     RegisterSerializer,
@@ -24,8 +24,8 @@ from rest_framework.authtoken.serializers import AuthTokenSerializer
 from knox.views import LoginView as KnoxLoginView
 
 
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from knox.auth import TokenAuthentication
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from .auth import CachedTokenAuthentication
 
 
 ######################
@@ -74,7 +74,7 @@ class UserRetrievalAPI(APIView):
     Allowed Methods: GET
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     user_keys = ["username", "email"]
     user_account_keys = [
@@ -87,12 +87,7 @@ class UserRetrievalAPI(APIView):
     ]
 
     def get(self, request):
-        user = UserSerializer(request.user)
-        user_account = UserAccountSerializer(UserAccount.objects.get(user=request.user))
-        user_serialized = dict(user.data)
-        user_account_serialized = dict(user_account.data)
-        user_serialized.update(user_account_serialized)
-        return Response(user_serialized)
+        return Response(profile_cache.get_profile(request.user.useraccount.id))
 
     def put(self, request):
         user = UserSerializer(request.user)
@@ -117,6 +112,7 @@ class UserRetrievalAPI(APIView):
             raise_exception=True
         ) and updated_user_account.is_valid(raise_exception=True):
 
+            # both saves invalidate the cached profile
             updated_user.save()
             updated_user_account.save()
 
@@ -131,21 +127,21 @@ class UserProfileViewAPI(APIView):
     Allowed Methods: GET
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, username):
-        try:
-            user = User.objects.get(username=username)
-            user_account = UserProfileSerializer(user.useraccount)
-            user = UserSerializer(user)
-            user_serialized = dict(user.data)
-            user_account_serialized = dict(user_account.data)
-            user_serialized.update(user_account_serialized)
-            return Response(user_serialized)
-        except User.DoesNotExist:
+        useraccount_id = profile_cache.get_useraccount_id(username)
+        if useraccount_id is None:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+        return Response(
+            profile_cache.project(
+                profile_cache.get_profile(useraccount_id),
+                profile_cache.PUBLIC_PROFILE_FIELDS,
+            )
+        )
+
 
 ##################
 #   Content APIs
@@ -159,15 +155,17 @@ class PostListAPI(APIView):
     TODO: The Enhanced Deepfake Detection Technology will later be integrated in the POST method of this API.
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        posts = Post.objects.filter(user=request.user.useraccount)
-        if not posts.exists():
+        posts = Post.objects.by_user(request.user.useraccount).values_list(
+            *representations.POST.lookups
+        )
+        if not posts:
             return Response({"detail": "No posts exist."}, status.HTTP_404_NOT_FOUND)
 
-        return Response(PostSerializer(posts, many=True).data)
+        return Response(representations.POST.from_rows(posts))
 
     def post(self, request):
         """
@@ -194,6 +192,7 @@ class PostListAPI(APIView):
             user=request.user.useraccount,
         )
         post.save()
+        on_commit(lambda: timelines.fan_out(post))
         return Response(PostSerializer(post).data, status.HTTP_201_CREATED)
 
 
@@ -203,27 +202,28 @@ class ConnectedUserPostListAPI(APIView):
     Allowed Methods: GET
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, username):
         try:
-            useraccount = User.objects.get(username=username).useraccount
-            connected_users = Connection.objects.get_connected_users(
-                request.user.useraccount
-            )
+            useraccount = UserAccount.objects.get(user__username=username)
 
-            if useraccount not in connected_users:
+            if not Connection.objects.are_connected(
+                request.user.useraccount, useraccount
+            ):
                 raise Exception
 
-            posts = Post.objects.filter(user=useraccount)
+            posts = Post.objects.by_user(useraccount).values_list(
+                *representations.POST.lookups
+            )
 
-            if not posts.exists():
+            if not posts:
                 return Response(
                     {"detail": "No posts exist."}, status.HTTP_404_NOT_FOUND
                 )
 
-            return Response(PostSerializer(posts, many=True).data)
+            return Response(representations.POST.from_rows(posts))
         except KeyboardInterrupt:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
@@ -235,71 +235,22 @@ class PostInteractionAPI(APIView):
     Posible interactions: LIKE, REPORT
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
-    @atomic
     def put(self, request, id, type):
         try:
-            post = Post.objects.get(id=id)
-            useraccount = post.user
-
-            connected_users = Connection.objects.get_connected_users(
-                request.user.useraccount
-            )
-            if useraccount not in connected_users:
-                return Response(
-                    {"detail": "Can't interact with posts of unconnected users."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            post_interaction = PostInteraction.objects.filter(
-                post=post, user=request.user.useraccount
-            )
-
-            if not post_interaction.exists():
-                post_interaction = PostInteraction(
-                    post=post, user=request.user.useraccount
-                )
-            else:
-                post_interaction = post_interaction.first()
-
-            if type == "like":
-                if post_interaction.like:
-                    post.likes -= 1
-                    post_interaction.like = False
-                    Notification.objects.delete_notification(
-                        "like", request.user.useraccount, post
-                    )
-                else:
-                    post.likes += 1
-                    post_interaction.like = True
-                    Notification.objects.create_like_notification(
-                        request.user.useraccount, post
-                    )
-
-            if type == "report":
-                if post_interaction.report:
-                    post.reports -= 1
-                    post_interaction.report = False
-                    Notification.objects.delete_notification(
-                        "report", request.user.useraccount, post
-                    )
-                else:
-                    post.reports += 1
-                    post_interaction.report = True
-                    Notification.objects.create_report_notification(
-                        request.user.useraccount, post
-                    )
-
-            post.save()
-            post_interaction.save()
+            post = PostInteraction.objects.toggle(request.user.useraccount, id, type)
 
             post_serialized = PostSerializer(post)
             return Response(post_serialized.data)
 
         except Post.DoesNotExist:
             return Response(status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as error:
+            return Response(
+                {"detail": error.messages[0]}, status=status.HTTP_400_BAD_REQUEST
+            )
 
 
 class PostAPI(APIView):
@@ -309,7 +260,7 @@ class PostAPI(APIView):
     TODO: The Enhanced Deepfake Detection Technology will later be integrated in the PUT method of this API.
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, id):
@@ -332,6 +283,7 @@ class PostAPI(APIView):
     def delete(self, request, id):
         try:
             post = Post.objects.get(user=request.user.useraccount, id=id)
+            timelines.remove_post(post)
             post.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Post.DoesNotExist:
@@ -340,24 +292,39 @@ class PostAPI(APIView):
 
 class FeedAPI(APIView):
     """
-    API to retrieve all the recent posts by connected users.
+    API to retrieve the recent posts by connected users, newest first.
     Allowed Methods: GET
+    Query Params: cursor (optional), page_size (optional)
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        connected_users = Connection.objects.get_connected_users(
-            request.user.useraccount
-        )
-        if not connected_users:
+        useraccount = request.user.useraccount
+        connected_user_ids = Connection.objects.connected_user_ids(useraccount)
+        if not connected_user_ids.exists():
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        posts = Post.objects.filter(user__in=connected_users)
+        paginator = KeysetPagination(page_size=settings.FEED_PAGE_SIZE)
+        keys = paginator.paginate_keys(
+            request,
+            Post,
+            lambda before, limit: timelines.feed_page(useraccount, before, limit),
+        )
 
-        return Response(
-            PostSerializer(posts, many=True).data, status=status.HTTP_200_OK
+        # timelines may briefly hold posts of users who were disconnected since
+        posts = {
+            post["id"]: post
+            for post in representations.POST.from_rows(
+                Post.objects.feed_posts(
+                    [post_id for _, post_id in keys], connected_user_ids
+                ).values_list(*representations.POST.lookups)
+            )
+        }
+
+        return paginator.get_paginated_response(
+            [posts[post_id] for _, post_id in keys if post_id in posts]
         )
 
 
@@ -368,14 +335,37 @@ class NotificationListAPI(APIView):
     Possible Notification Types: LIKE, SHARE, POST, REPORT
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
+        """
+        Query Params:
+            cursor (optional), page_size (optional),
+            since (optional): only the notifications newer than this id, oldest first
+        """
         user = request.user.useraccount
-        notifications = Notification.objects.filter(sent_to__in=[user])
-        notifications_serialized = NotificationSerializer(notifications, many=True)
-        return Response(notifications_serialized.data, status=status.HTTP_200_OK)
+        received = Notification.objects.received_by(user)
+
+        since = request.query_params.get("since")
+        if since is not None:
+            try:
+                received = received.filter(notification_id__gt=int(since))
+            except ValueError:
+                return Response(
+                    {"detail": "since should be a notification id."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            paginator = KeysetPagination(ordering=("notification_id",))
+        else:
+            paginator = KeysetPagination(ordering=("-notification_id",))
+
+        received = paginator.paginate_queryset(received, request)
+        return paginator.get_paginated_response(
+            representations.NOTIFICATION.from_instances(
+                [row.notification for row in received]
+            )
+        )
 
     def post(self, request):
         """
@@ -393,22 +383,22 @@ class NotificationListAPI(APIView):
             notification_type = notification_data["type"]
             post = Post.objects.get(id=notification_data["post_id"])
 
-            connected_users = Connection.objects.get_connected_users(
-                request.user.useraccount
+            connected_user_ids = set(
+                Connection.objects.connected_user_ids(request.user.useraccount)
             )
 
-            if not connected_users:
+            if not connected_user_ids:
                 raise Exception("Users not connected.")
 
             if notification_type == "like":
-                if post.user not in connected_users:
+                if post.user_id not in connected_user_ids:
                     raise Exception
                 notification = Notification.objects.create_like_notification(
                     request.user.useraccount, post
                 )
 
             elif notification_type == "share":
-                if post.user not in connected_users:
+                if post.user_id not in connected_user_ids:
                     raise Exception
 
                 notification = Notification.objects.create_share_notification(
@@ -416,7 +406,7 @@ class NotificationListAPI(APIView):
                 )
 
             elif notification_type == "report":
-                if post.user not in connected_users:
+                if post.user_id not in connected_user_ids:
                     raise Exception
 
                 notification = Notification.objects.create_report_notification(
@@ -428,7 +418,7 @@ class NotificationListAPI(APIView):
                     raise Exception
 
                 notification = Notification.objects.create_post_notification(
-                    connected_users, post
+                    connected_user_ids, post
                 )
 
             else:
@@ -449,26 +439,74 @@ class NotificationListAPI(APIView):
             )
 
 
+class NotificationUnreadAPI(APIView):
+    """
+    Unread notifications counter of the logged in user.
+    Allowed Methods: GET, PUT
+    """
+
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user.useraccount
+        return Response(
+            {
+                "unread": user.unread_notifications_count,
+                "last_read_id": user.last_read_notification_id,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def put(self, request):
+        """
+        Marks the notifications as read. The API accepts the optional attribute:
+            {"last_read_id"}
+        to only mark the notifications up to that id, otherwise all of them are marked.
+        """
+        last_read_id = request.data.get("last_read_id")
+        try:
+            last_read_id = None if last_read_id is None else int(last_read_id)
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "last_read_id should be a notification id."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        user = request.user.useraccount
+        Notification.objects.mark_read(user, last_read_id)
+        user.refresh_from_db(
+            fields=["unread_notifications_count", "last_read_notification_id"]
+        )
+
+        return self.get(request)
+
+
 ####################
 #   Connection APIs
 ####################
 
 
 class ConnectionsListAPI(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        connected_useraccounts = Connection.objects.get_connected_users(
-            request.user.useraccount
+        connected_user_ids = list(
+            Connection.objects.connected_user_ids(request.user.useraccount)
         )
 
-        if not len(connected_useraccounts):
+        if not connected_user_ids:
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        connected_useraccounts_serialized = ConnectedUserSerializer(
-            connected_useraccounts, many=True
-        ).data
+        profiles = profile_cache.get_profiles(connected_user_ids)
+        connected_useraccounts_serialized = [
+            profile_cache.project(
+                profiles[useraccount_id], profile_cache.CONNECTED_USER_FIELDS
+            )
+            for useraccount_id in connected_user_ids
+            if useraccount_id in profiles
+        ]
 
         return Response(connected_useraccounts_serialized, status=status.HTTP_200_OK)
 
@@ -490,26 +528,26 @@ class ConnectionsAPI(APIView):
 
 
 class ConnectionRequestListAPI(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        connection_requests = Connection.objects.filter(
-            users__in=[request.user.useraccount], accepted=False
-        )
+        connection_requests = Connection.objects.pending_requests(
+            request.user.useraccount
+        ).values_list(*representations.CONNECTION.lookups)
 
-        if not connection_requests.exists():
+        if not connection_requests:
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        connection_requests_serialized = ConnectionSerializer(
-            connection_requests, many=True
-        ).data
+        connection_requests_serialized = representations.CONNECTION.from_rows(
+            connection_requests
+        )
 
         return Response(connection_requests_serialized, status=status.HTTP_200_OK)
 
 
 class ConnectionRequestAPI(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request, username):
@@ -550,7 +588,7 @@ class ConnectionRequestAPI(APIView):
 
 class ConnectionRequestResponseAPI(APIView):
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def put(self, request, username, accept):
@@ -594,12 +632,44 @@ class ConnectionRequestResponseAPI(APIView):
             )
 
 
+#################
+#   Metrics APIs
+#################
+
+
+class MetricsAPI(APIView):
+    """
+    Per endpoint request metrics of all the processes, when METRICS_ENABLED. For staff users only.
+    Allowed Methods: GET
+    """
+
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        if not settings.METRICS_ENABLED:
+            return Response(
+                {"details": "Metrics are not enabled."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        metrics.registry.flush(settings.METRICS_DIR)
+        return Response(
+            {
+                endpoint: endpoint_metrics.summary()
+                for endpoint, endpoint_metrics in sorted(
+                    metrics.load(settings.METRICS_DIR).items()
+                )
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class SuggestedUserAPI(APIView):
     """
     TODO: Implementation pending until a further research over implementation.
     """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
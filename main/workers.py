@@ -0,0 +1,42 @@
+"""
+Local worker pool to run work off the request path, in the same process.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.WORKER_POOL_SIZE, thread_name_prefix="worker"
+        )
+
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Runs fn(*args, **kwargs) on the worker pool, with its own database connection.
+    Exceptions are logged, as there is no request to report them to.
+    """
+
+    def run():
+        close_old_connections()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            logger.exception("Worker task %s failed.", getattr(fn, "__name__", fn))
+        finally:
+            close_old_connections()
+
+    return get_executor().submit(run)